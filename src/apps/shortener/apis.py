@@ -1,18 +1,27 @@
-from typing import List
+import json
+from datetime import datetime, timedelta, timezone
+from typing import List, Literal, Optional
 from sqlalchemy import func
 from redis.asyncio import Redis
-from fastapi import Query, Request, APIRouter, Depends, status, HTTPException
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi import Query, Request, Response, APIRouter, Depends, status, HTTPException
+from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from services import campaign_services
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
 from pydantic import BaseModel
-from apps.shortener.schemas import CampaignMediumCreate, CampaignMediumUpdate, CampaignNameCreate, CampaignNameUpdate, CampaignSourceCreate, CampaignSourceUpdate, ShortenUrlRequest, ShortenUrlResponse
+from apps.shortener.schemas import CampaignMediumCreate, CampaignMediumUpdate, CampaignNameCreate, CampaignNameUpdate, CampaignSourceCreate, CampaignSourceUpdate, ShortenBatchResponse, ShortenUrlRequest, ShortenUrlResponse, VisitLogPage, CampaignSourceRead, CampaignMediumRead, CampaignNameRead
 from apps.shortener.models import ShortenedUrl, VisitLog
 from apps.shortener.controllers import shortener_controller
-from services.redis import get_redis
+from core.config import click_stats_config, pagination_config, partition_config, shorten_batch_config, timing_config
+from services.redis import get_redis, redis_pool_stats
 from services.visit_service import visit_service
-from services.database import async_session, get_session, engine, Base
+from services.click_stats import click_stats
+from services.visit_rollup import DIMENSIONS, visit_rollup
+from services.url_cache import url_cache
+from services.code_filter import code_filter
+from services.expiry_sweeper import expiry_sweeper
+from services.profiler import sampling_profiler
+from services.database import async_session, get_session, engine, Base, session_metrics
 from apps.shortener import schemas as campaign_schemas
 from services import campaign_services
 
@@ -29,6 +38,7 @@ shortener_router = APIRouter(
     prefix=""
 )
 utm_router = APIRouter(prefix="/utm", tags=["UTM"])
+ops_router = APIRouter(prefix="/ops", tags=["Ops"])
 
 # --- Shorten URL API ---
 @shortener_router.post(
@@ -48,6 +58,69 @@ async def shorten(
     )
 
 
+# --- Bulk Shorten API ---
+async def read_batch_items(request: Request) -> list:
+    # Either a JSON array or NDJSON (one ShortenUrlRequest per line). A malformed
+    # NDJSON line is kept in place as its error so the other lines still go through.
+    too_many = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"A batch may contain at most {shorten_batch_config.max_items} items.",
+    )
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" not in content_type and "jsonlines" not in content_type:
+        try:
+            items = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON.")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON.")
+        if len(items) > shorten_batch_config.max_items:
+            raise too_many
+        return items
+
+    items = []
+    buffer = b""
+    line_number = 0
+
+    def parse_line(line: bytes):
+        nonlocal line_number
+        line_number += 1
+        if not line.strip():
+            return
+        if len(items) >= shorten_batch_config.max_items:
+            raise too_many
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            items.append(ValueError(f"Line {line_number} is not valid JSON"))
+
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            parse_line(line)
+    parse_line(buffer)
+    return items
+
+
+@shortener_router.post(
+    "/shorten/batch",
+    response_model=ShortenBatchResponse,
+    status_code=status.HTTP_200_OK,
+)
+async def shorten_batch(
+    request: Request,
+    db: AsyncSession = Depends(get_session),
+    redis: Redis = Depends(get_redis)
+):
+    items = await read_batch_items(request)
+    return await shortener_controller.shorten_batch(
+        db=db,
+        redis=redis,
+        items=items
+    )
+
+
 # --- Redirect API ---
 @shortener_router.get("/{short_url}", status_code=status.HTTP_200_OK)
 async def redirect_to_main_url(
@@ -88,34 +161,173 @@ async def redirect_to_main_url(
 
 
 # --- Click Count API ---
-@shortener_router.get("/stats/{short_url}")
-async def get_click_count(short_url: str, db: AsyncSession = Depends(get_session)):
-    query = select(VisitLog).where(VisitLog.short_url == short_url)
-    result = await db.execute(query)
-    logs = result.fetchall()
-    click_count = len(logs)
+def stats_range(from_: Optional[datetime], to: Optional[datetime], granularity: str):
+    # Buckets are UTC; naive datetimes are taken as UTC
+    if from_ is not None and from_.tzinfo is not None:
+        from_ = from_.astimezone(timezone.utc).replace(tzinfo=None)
+    if to is not None and to.tzinfo is not None:
+        to = to.astimezone(timezone.utc).replace(tzinfo=None)
+    default_range = (
+        timedelta(days=click_stats_config.default_days) if granularity == "day"
+        else timedelta(hours=click_stats_config.default_hours)
+    )
+    to = to or (from_ + default_range if from_ else datetime.utcnow())
+    from_ = from_ or to - default_range
+    if from_ > to:
+        raise HTTPException(status_code=400, detail="'from' must not be later than 'to'.")
+    return from_, to
 
-    return {"short_url": short_url, "click_count": click_count}
+
+@shortener_router.get("/stats/{short_url}")
+async def get_click_count(
+    short_url: str,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = Query(None),
+    granularity: Optional[Literal["hour", "day"]] = Query(None),
+    db: AsyncSession = Depends(get_session),
+    redis: Redis = Depends(get_redis)
+):
+    if not code_filter.might_contain(short_url):
+        return {"short_url": short_url, "click_count": 0}
+
+    click_count = await click_stats.total(db, redis, short_url)
+    if from_ is None and to is None and granularity is None:
+        return {"short_url": short_url, "click_count": click_count}
+
+    granularity = granularity or "day"
+    from_, to = stats_range(from_, to, granularity)
+    series = await click_stats.series(db, redis, short_url, granularity, from_, to)
+    return {
+        "short_url": short_url,
+        "click_count": click_count,
+        "granularity": granularity,
+        "from": from_.isoformat(),
+        "to": to.isoformat(),
+        "series": series,
+    }
+
+
+@shortener_router.get("/stats/{short_url}/breakdown/{dimension}")
+async def get_click_breakdown(
+    short_url: str,
+    dimension: Literal[DIMENSIONS],
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = Query(None),
+    granularity: Literal["hour", "day"] = Query("day"),
+    db: AsyncSession = Depends(get_session)
+):
+    # Read from the rollups only, so the cost doesn't grow with VisitLog
+    from_, to = stats_range(from_, to, granularity)
+    breakdown = await visit_rollup.breakdown(db, short_url, dimension, granularity, from_, to)
+    return {
+        "short_url": short_url,
+        "dimension": dimension,
+        "granularity": granularity,
+        "from": from_.isoformat(),
+        "to": to.isoformat(),
+        "breakdown": breakdown,
+    }
 
 
 # --- Visit Logs by Client IP API ---
-@shortener_router.get("/visitlogs/client/{client_ip}")
+# visit_service bounds every visit log query so Postgres only scans the partitions in range
+VISITS_FROM_DESCRIPTION = (
+    f"Defaults to {partition_config.default_lookback_days} days before `to` "
+    "(PARTITION_DEFAULT_LOOKBACK_DAYS); pass an earlier date to search further back"
+)
+
+
+@shortener_router.get("/visitlogs/client/{client_ip}", response_model=VisitLogPage)
 async def get_visits_by_client_ip(
     client_ip: str,
+    from_: Optional[datetime] = Query(None, alias="from", description=VISITS_FROM_DESCRIPTION),
+    to: Optional[datetime] = Query(None, description="Defaults to now"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(pagination_config.default_limit, ge=1, le=pagination_config.max_limit),
     db: AsyncSession = Depends(get_session)
 ):
-    visits = await visit_service.get_visits_by_client_ip(db, client_ip)
-    if visits:
-        return {"client_ip": client_ip, "visit_logs": visits}
+    visits, next_cursor = await visit_service.get_visits_by_client_ip(
+        db, client_ip, since=from_, until=to, cursor=cursor, limit=limit
+    )
+    if visits or cursor:
+        return {"client_ip": client_ip, "visit_logs": visits, "next_cursor": next_cursor}
 
     raise HTTPException(status_code=404, detail="No visit logs found for this client IP")
 
 
+@shortener_router.get("/visitlogs/client/{client_ip}/export")
+async def export_visits_by_client_ip(
+    client_ip: str,
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    from_: Optional[datetime] = Query(None, alias="from", description=VISITS_FROM_DESCRIPTION),
+    to: Optional[datetime] = Query(None, description="Defaults to now"),
+):
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        visit_service.export_visits_by_client_ip(client_ip, format, since=from_, until=to),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="visits-{client_ip}.{format}"'},
+    )
+
+
+
+
+
+#-------------Ops------------------#
+
+@ops_router.get("/cache-stats")
+async def get_cache_stats():
+    # Per worker: each gunicorn worker answers with its own in-process cache
+    return {"redirect_l1": url_cache.local.stats(), "code_filter": code_filter.stats()}
+
+
+@ops_router.get("/rollup-watermark")
+async def get_rollup_watermark(db: AsyncSession = Depends(get_session)):
+    return await visit_rollup.watermark(db)
+
+
+@ops_router.get("/db-stats")
+async def get_db_stats():
+    # Per worker, like /ops/cache-stats
+    return session_metrics.stats()
+
+
+@ops_router.get("/redis-stats")
+async def get_redis_stats():
+    # Per worker, like /ops/cache-stats
+    return redis_pool_stats()
+
+
+@ops_router.get("/profile", response_class=PlainTextResponse)
+async def get_profile(seconds: float = Query(10.0, gt=0, le=timing_config.profiler_max_seconds)):
+    # Folded stacks of this worker for `seconds`; feed them to flamegraph.pl or speedscope
+    if not timing_config.profiler_enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (TIMING_PROFILER_ENABLED).")
+    try:
+        return await sampling_profiler.profile(seconds, timing_config.profiler_interval)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 
+@ops_router.get("/sweeper-stats")
+async def get_sweeper_stats(redis: Redis = Depends(get_redis)):
+    return await expiry_sweeper.stats(redis)
+
 
 #-------------Campaign------------------#
 
+CAMPAIGN_LIMIT_DESCRIPTION = (
+    "Page size; with neither cursor nor limit the whole list is returned. "
+    f"With a cursor alone pages are {pagination_config.default_limit} long."
+)
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    # Campaign lists stay plain JSON arrays; the next page is announced in a header
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+
 @campaign_router.post("/campaign/source")
 async def create_campaign_source(
     payload: CampaignSourceCreate,
@@ -128,9 +340,17 @@ async def create_campaign_source(
         payload.campaign_source_name
     )
 
-@campaign_router.get("/campaign/source/{user_id}")
-async def get_campaign_sources(user_id: str, db: AsyncSession = Depends(get_session)):
-    return await campaign_services.get_campaign_sources_by_user(db, user_id)
+@campaign_router.get("/campaign/source/{user_id}", response_model=List[CampaignSourceRead])
+async def get_campaign_sources(
+    user_id: str,
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=pagination_config.max_limit, description=CAMPAIGN_LIMIT_DESCRIPTION),
+    db: AsyncSession = Depends(get_session)
+):
+    items, next_cursor = await campaign_services.get_campaign_sources_by_user(db, user_id, cursor, limit)
+    set_next_cursor(response, next_cursor)
+    return items
 
 
 @campaign_router.put("/campaign/source/{user_id}/{unique_id}")
@@ -168,9 +388,17 @@ async def create_campaign_medium(
         payload.campaign_medium_name
     )
 
-@campaign_router.get("/campaign/medium/{user_id}")
-async def get_campaign_mediums(user_id: str, db: AsyncSession = Depends(get_session)):
-    return await campaign_services.get_campaign_mediums_by_user(db, user_id)
+@campaign_router.get("/campaign/medium/{user_id}", response_model=List[CampaignMediumRead])
+async def get_campaign_mediums(
+    user_id: str,
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=pagination_config.max_limit, description=CAMPAIGN_LIMIT_DESCRIPTION),
+    db: AsyncSession = Depends(get_session)
+):
+    items, next_cursor = await campaign_services.get_campaign_mediums_by_user(db, user_id, cursor, limit)
+    set_next_cursor(response, next_cursor)
+    return items
 
 
 @campaign_router.put("/campaign/medium/{user_id}/{unique_id}")
@@ -209,9 +437,17 @@ async def create_campaign_name(
     )
 
 
-@campaign_router.get("/campaign/name/{user_id}")
-async def get_campaign_names(user_id: str, db: AsyncSession = Depends(get_session)):
-    return await campaign_services.get_campaign_names_by_user(db, user_id)
+@campaign_router.get("/campaign/name/{user_id}", response_model=List[CampaignNameRead])
+async def get_campaign_names(
+    user_id: str,
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=pagination_config.max_limit, description=CAMPAIGN_LIMIT_DESCRIPTION),
+    db: AsyncSession = Depends(get_session)
+):
+    items, next_cursor = await campaign_services.get_campaign_names_by_user(db, user_id, cursor, limit)
+    set_next_cursor(response, next_cursor)
+    return items
 
 
 @campaign_router.put("/campaign/name/{user_id}/{unique_id}")
@@ -1,41 +1,48 @@
-import random
-import string
 import re
 from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
 from fastapi import Request, HTTPException
 from fastapi.responses import RedirectResponse, JSONResponse
 from redis.asyncio import Redis
+from pydantic import ValidationError
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from apps.shortener.models import ShortenedUrl
-from apps.shortener.schemas import ShortenUrlRequest, ShortenUrlResponse
-from core.config import app_config
-from services.location_service import get_location_from_ip
+from apps.shortener.schemas import CachedShortenedUrl, ShortenBatchItemResult, ShortenBatchResponse, ShortenUrlRequest, ShortenUrlResponse
+from core.config import app_config, shorten_batch_config
+from services.click_counter import click_counter
+from services.click_stats import click_stats
+from services.code_allocator import code_allocator
+from services.code_filter import code_filter
+from services.database import insert_chunks, release
+from services.metrics import BLOOM_REJECT, REDIRECTS
+from services.redirect_lookup import redirect_lookup
+from services.timing import phase
+from services.url_cache import url_cache
 from services.visit_service import visit_service
 import pytz
 from urllib.parse import urlencode, urlparse, parse_qsl, urlunparse
 
+CUSTOM_CODE_PATTERN = re.compile(r'^[a-zA-Z0-9_-]{5,30}$')
+CUSTOM_CODE_ERROR = "Custom short code must be 5-30 characters and only use letters, digits, hyphens, or underscores."
+
+NOT_FOUND_DETAIL = "Shortened URL not found"
+EXPIRED_DETAIL = "Shortened URL has expired"
+CLICK_LIMIT_DETAIL = "Shortened URL has expired (click limit reached)"
+# redirect_outcomes_total label for each way a redirect can fail
+REDIRECT_OUTCOMES = {NOT_FOUND_DETAIL: "not_found", EXPIRED_DETAIL: "expired", CLICK_LIMIT_DETAIL: "click_limit"}
 
 
 class ShortenerController:
 
-    MAX_CACHE_TTL = 30 * 24 * 60 * 60  # 30 days in seconds
+    MAX_INSERT_ATTEMPTS = 3
 
     def __init__(self):
         pass
 
-    @staticmethod
-    def generate_random_characters(length: int) -> str:
-        if length < 2:
-            raise ValueError("Length must be at least 2 to include both letter and digit.")
-        letters = string.ascii_letters
-        digits = string.digits
-        char_set = letters + digits
-        code = [random.choice(letters), random.choice(digits)] + \
-               [random.choice(char_set) for _ in range(length - 2)]
-        random.shuffle(code)
-        return ''.join(code)
-
     @staticmethod
     def utc_to_ist(utc_dt):
         ist = pytz.timezone("Asia/Kolkata")
@@ -43,18 +50,57 @@ class ShortenerController:
             utc_dt = pytz.utc.localize(utc_dt)
         return utc_dt.astimezone(ist)
 
+    @staticmethod
+    def normalize_domain(custom_domain: Optional[str]) -> str:
+        # Determine final domain (remove http/https and trailing slash)
+        return (custom_domain or app_config.default_domain).replace("http://", "").replace("https://", "").rstrip("/")
+
+    @staticmethod
+    def calculate_expiry(payload: ShortenUrlRequest, now: datetime) -> datetime:
+        duration = payload.duration_value
+        unit = payload.duration_unit
+
+        if unit == "minutes":
+            return now + timedelta(minutes=duration)
+        elif unit == "hours":
+            return now + timedelta(hours=duration)
+        elif unit == "days":
+            return now + timedelta(days=duration)
+        elif unit == "months":
+            return now + timedelta(days=duration * 30)
+        elif unit == "years":
+            return now + timedelta(days=duration * 365)
+        else:
+            raise ValueError("Unsupported duration unit")
+
+    @staticmethod
+    def is_reclaimable(existing_url: ShortenedUrl, now: datetime) -> bool:
+        is_time_expired = existing_url.expires_at and existing_url.expires_at < now
+        is_clicks_expired = existing_url.expired or (
+            existing_url.max_clicks is not None and
+            existing_url.click_count >= existing_url.max_clicks
+        )
+        return bool(is_time_expired or is_clicks_expired)
+
+    def build_response(self, shortened_url: ShortenedUrl) -> ShortenUrlResponse:
+        return ShortenUrlResponse(
+            main_url=shortened_url.main_url,
+            short_url=shortened_url.short_url,
+            custom_domain=shortened_url.custom_domain,
+            max_clicks=shortened_url.max_clicks,
+            created_at=self.utc_to_ist(shortened_url.created_at).strftime("%Y-%m-%d %H:%M:%S"),
+            updated_at=self.utc_to_ist(shortened_url.updated_at).strftime("%Y-%m-%d %H:%M:%S"),
+            expires_at=self.utc_to_ist(shortened_url.expires_at).strftime("%Y-%m-%d %H:%M:%S"),
+        )
+
     async def shorten(
         self, db: AsyncSession, payload: ShortenUrlRequest, redis: Redis
     ) -> ShortenUrlResponse:
-        # Determine final domain (remove http/https and trailing slash)
-        domain = (payload.custom_domain or app_config.default_domain).replace("http://", "").replace("https://", "").rstrip("/")
+        domain = self.normalize_domain(payload.custom_domain)
         
         if payload.custom_code:
-            if not re.match(r'^[a-zA-Z0-9_-]{5,30}$', payload.custom_code):
-                raise HTTPException(
-                    status_code=400,
-                    detail="Custom short code must be 5-30 characters and only use letters, digits, hyphens, or underscores."
-                )
+            if not CUSTOM_CODE_PATTERN.match(payload.custom_code):
+                raise HTTPException(status_code=400, detail=CUSTOM_CODE_ERROR)
 
             # Check if code already exists for that domain
             statement = select(ShortenedUrl).where(
@@ -63,21 +109,18 @@ class ShortenerController:
             )
             print("Requested short_url:", payload.custom_code)
 
-            result = await db.execute(statement)
-            existing_url = result.first()
+            with phase("db"):
+                result = await db.execute(statement)
+                existing_url = result.scalars().first()
 
             if existing_url:
-                now = datetime.utcnow()
-                is_time_expired = existing_url.expires_at and existing_url.expires_at < now
-                is_clicks_expired = (
-                    existing_url.max_clicks is not None and 
-                    existing_url.click_count >= existing_url.max_clicks
-                )
-
-                if is_time_expired or is_clicks_expired:
-                    await db.delete(existing_url)  # Deleted expired entry from DB
-                    await db.commit()
-                    await redis.delete(payload.custom_code)  # Deleted expired entry from Redis
+                if self.is_reclaimable(existing_url, datetime.utcnow()):
+                    with phase("db_commit"):
+                        await db.delete(existing_url)  # Deleted expired entry from DB
+                        await db.commit()
+                    with phase("redis"):
+                        await url_cache.delete(redis, payload.custom_code)  # Deleted expired entry from Redis
+                        await click_counter.discard(redis, payload.custom_code)
                 else:
                     raise HTTPException(
                         status_code=400,
@@ -86,104 +129,279 @@ class ShortenerController:
 
             short_url = payload.custom_code  # Reused custom short code
         else:
-            while True:
-                short_url = self.generate_random_characters(length=5)
-                statement = select(ShortenedUrl).where(
-                    ShortenedUrl.short_url == short_url,
-                    ShortenedUrl.custom_domain == domain
-                )
-                result = await db.execute(statement)
-                if not result.first():
-                    break
+            with phase("code_alloc"):
+                short_url = await code_allocator.allocate(db, domain)
 
-        
-        full_short_url = f"{domain}/{short_url}"
         now = datetime.utcnow()
-           
-
+        expires_at = self.calculate_expiry(payload, now)
+
+        for attempt in range(self.MAX_INSERT_ATTEMPTS):
+            shortened_url = ShortenedUrl(
+                main_url=payload.main_url,
+                short_url=short_url,
+                custom_domain=domain,
+                max_clicks=payload.max_clicks,
+                created_at=now,
+                updated_at=now,
+                expires_at=expires_at
+            )
+            db.add(shortened_url)
+            try:
+                with phase("db_commit"):
+                    await db.commit()
+                break
+            except IntegrityError:
+                # The unique index on short_url is the only uniqueness check; a clash
+                # means a concurrent custom code or a code from the old random scheme
+                await db.rollback()
+                if payload.custom_code:
+                    raise HTTPException(status_code=400, detail="Custom short code already exists.")
+                if attempt == self.MAX_INSERT_ATTEMPTS - 1:
+                    raise
+                with phase("code_alloc"):
+                    short_url = await code_allocator.allocate(db, domain)
+
+        cached_url = url_cache.from_model(shortened_url)
+        with phase("redis"):
+            await url_cache.set(redis, cached_url, now)
+            await code_filter.add(redis, [short_url])
+            await click_counter.seed(redis, short_url, 0, url_cache.ttl_for(cached_url, now), overwrite=True)
+            await click_stats.start(redis, [short_url])
+
+        return self.build_response(shortened_url)
 
-        # Calculate expiry
-        duration = payload.duration_value
-        unit = payload.duration_unit
+    @staticmethod
+    def _validation_message(exc: ValidationError) -> str:
+        return "; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" if error["loc"] else error["msg"]
+            for error in exc.errors()
+        )
 
-        if unit == "minutes":
-            expires_at = now + timedelta(minutes=duration)
-        elif unit == "hours":
-            expires_at = now + timedelta(hours=duration)
-        elif unit == "days":
-            expires_at = now + timedelta(days=duration)
-        elif unit == "months":
-            expires_at = now + timedelta(days=duration * 30)
-        elif unit == "years":
-            expires_at = now + timedelta(days=duration * 365)
-        else:
-            raise ValueError("Unsupported duration unit")
+    async def _reclaim_custom_codes(
+        self, db: AsyncSession, short_urls: List[str], now: datetime
+    ) -> Tuple[Set[str], List[ShortenedUrl]]:
+        # One set-based lookup for every custom code in the batch: live codes are
+        # returned as taken, expired ones are deleted so they can be reused
+        taken: Set[str] = set()
+        reclaimed: List[ShortenedUrl] = []
+        for start in range(0, len(short_urls), shorten_batch_config.lookup_chunk_size):
+            chunk = short_urls[start:start + shorten_batch_config.lookup_chunk_size]
+            result = await db.execute(select(ShortenedUrl).where(ShortenedUrl.short_url.in_(chunk)))
+            for existing_url in result.scalars().all():
+                if self.is_reclaimable(existing_url, now):
+                    reclaimed.append(existing_url)
+                else:
+                    taken.add(existing_url.short_url)
+        if reclaimed:
+            await db.execute(
+                delete(ShortenedUrl).where(ShortenedUrl.id.in_([existing_url.id for existing_url in reclaimed]))
+            )
+        return taken, reclaimed
+
+    async def _insert_rows(self, db: AsyncSession, rows: List[dict]) -> Set[str]:
+        # Rows whose short_url is already taken are skipped instead of aborting the batch
+        inserted: Set[str] = set()
+        for chunk in insert_chunks(rows):
+            result = await db.execute(
+                pg_insert(ShortenedUrl)
+                .values(chunk)
+                .on_conflict_do_nothing(index_elements=["short_url"])
+                .returning(ShortenedUrl.short_url)
+            )
+            inserted.update(result.scalars().all())
+        return inserted
 
-        shortened_url = ShortenedUrl(
-            main_url=payload.main_url,
-            short_url=short_url,
-            custom_domain=domain,
-            max_clicks=payload.max_clicks,
-            created_at=now,
-            updated_at=now,
-            expires_at=expires_at
-        )
-        db.add(shortened_url)
+    async def shorten_batch(
+        self, db: AsyncSession, redis: Redis, items: List[Any]
+    ) -> ShortenBatchResponse:
+        now = datetime.utcnow()
+        errors: Dict[int, str] = {}
+        payloads: Dict[int, ShortenUrlRequest] = {}
+        custom_codes: Dict[str, int] = {}
+
+        # Validate everything up front; a bad item only fails itself
+        for index, item in enumerate(items):
+            if isinstance(item, Exception):
+                errors[index] = str(item)
+                continue
+            try:
+                payload = ShortenUrlRequest.model_validate(item)
+            except ValidationError as exc:
+                errors[index] = self._validation_message(exc)
+                continue
+            if payload.custom_code:
+                if not CUSTOM_CODE_PATTERN.match(payload.custom_code):
+                    errors[index] = CUSTOM_CODE_ERROR
+                    continue
+                if payload.custom_code in custom_codes:
+                    errors[index] = "Custom short code is repeated in this batch."
+                    continue
+                custom_codes[payload.custom_code] = index
+            payloads[index] = payload
+
+        taken, reclaimed = await self._reclaim_custom_codes(db, list(custom_codes), now)
+        for short_url in taken:
+            errors[custom_codes[short_url]] = "Custom short code already exists."
+            del payloads[custom_codes[short_url]]
+
+        domains = {index: self.normalize_domain(payload.custom_domain) for index, payload in payloads.items()}
+        short_urls = {
+            index: payload.custom_code for index, payload in payloads.items() if payload.custom_code
+        }
+        rows: Dict[int, dict] = {}
+        for attempt in range(self.MAX_INSERT_ATTEMPTS):
+            # Codes are allocated in one call per domain rather than one per item
+            unallocated: Dict[str, List[int]] = {}
+            for index in payloads:
+                if index not in short_urls:
+                    unallocated.setdefault(domains[index], []).append(index)
+            for domain, indexes in unallocated.items():
+                codes = await code_allocator.allocate_many(db, domain, len(indexes))
+                short_urls.update(zip(indexes, codes))
+
+            attempt_rows = {
+                index: {
+                    "main_url": payload.main_url,
+                    "short_url": short_urls[index],
+                    "custom_domain": domains[index],
+                    "click_count": 0,
+                    "max_clicks": payload.max_clicks,
+                    "active": True,
+                    "expired": False,
+                    "created_at": now,
+                    "updated_at": now,
+                    "expires_at": self.calculate_expiry(payload, now),
+                }
+                for index, payload in payloads.items()
+                if index not in rows
+            }
+            if not attempt_rows:
+                break
+            inserted = await self._insert_rows(db, list(attempt_rows.values()))
+
+            for index, row in attempt_rows.items():
+                if row["short_url"] in inserted:
+                    rows[index] = row
+                elif payloads[index].custom_code:
+                    # Claimed by a concurrent request since the lookup
+                    errors[index] = "Custom short code already exists."
+                    del payloads[index]
+                elif attempt == self.MAX_INSERT_ATTEMPTS - 1:
+                    errors[index] = "Could not allocate a unique short code."
+                    del payloads[index]
+                else:
+                    del short_urls[index]
         await db.commit()
 
-        return ShortenUrlResponse(
-            main_url=payload.main_url,
-            short_url=short_url,
-            custom_domain=domain,
-            max_clicks=payload.max_clicks,
-            created_at=self.utc_to_ist(shortened_url.created_at).strftime("%Y-%m-%d %H:%M:%S"),
-            updated_at=self.utc_to_ist(shortened_url.updated_at).strftime("%Y-%m-%d %H:%M:%S"),
-            expires_at=self.utc_to_ist(shortened_url.expires_at).strftime("%Y-%m-%d %H:%M:%S"),
+        if reclaimed:
+            reclaimed_codes = [existing_url.short_url for existing_url in reclaimed]
+            await url_cache.delete_many(redis, reclaimed_codes)
+            await click_counter.discard(redis, *reclaimed_codes)
+
+        created = [ShortenedUrl(**row) for row in rows.values()]
+        if created:
+            cached_urls = [url_cache.from_model(shortened_url) for shortened_url in created]
+            await url_cache.set_many(redis, cached_urls, now)
+            await code_filter.add(redis, [shortened_url.short_url for shortened_url in created])
+            await click_counter.seed_many(redis, {
+                cached_url.short_url: url_cache.ttl_for(cached_url, now) for cached_url in cached_urls
+            })
+            await click_stats.start(redis, [shortened_url.short_url for shortened_url in created])
+
+        responses = {index: self.build_response(shortened_url) for index, shortened_url in zip(rows, created)}
+        return ShortenBatchResponse(
+            created=len(responses),
+            failed=len(errors),
+            items=[
+                ShortenBatchItemResult(index=index, result=responses.get(index), error=errors.get(index))
+                for index in range(len(items))
+            ],
         )
     
-    async def redirect_to_main_url(self, db: AsyncSession, redis: Redis, short_url: str, request: Request) -> RedirectResponse | JSONResponse:
+    async def resolve(self, db: AsyncSession, redis: Redis, short_url: str, request: Request) -> CachedShortenedUrl:
+        # Code -> live record, consuming one click and enqueuing the visit. Shared
+        # by the API's redirect route and the redirect-only app in core.redirect_app.
         now = datetime.utcnow()
-        redis_key = f"{short_url}"
-
-        statement = select(ShortenedUrl).where(ShortenedUrl.short_url == short_url)
-        result = await db.execute(statement)
-        shortened_url = result.scalar_one_or_none()
-
-        if not shortened_url:
-            raise HTTPException(status_code=404, detail="Shortened URL not found")
-
-        if shortened_url.max_clicks is not None and shortened_url.click_count >= shortened_url.max_clicks:
-            await db.delete(shortened_url)
-            await db.commit()
-            await redis.delete(redis_key)
-            raise HTTPException(status_code=404, detail="Shortened URL has expired (click limit reached)")
-
-        if shortened_url.expires_at and shortened_url.expires_at < now:
-            await db.delete(shortened_url)
-            await db.commit()
-            await redis.delete(redis_key)
-            raise HTTPException(status_code=404, detail="Shortened URL has expired")
-
-        shortened_url.click_count += 1
-        shortened_url.updated_at = now
-        db.add(shortened_url)
-        await db.commit()
 
-        if not await redis.get(redis_key):
-            ttl = int((shortened_url.expires_at - now).total_seconds()) if shortened_url.expires_at else self.MAX_CACHE_TTL
-            ttl = min(ttl, self.MAX_CACHE_TTL)
-            await redis.set(redis_key, shortened_url.main_url, ex=ttl)
-        else:
-            await redis.set(redis_key, shortened_url.main_url, ex=self.MAX_CACHE_TTL)
+        # Codes the filter has never seen are still looked up in Redis (a code
+        # created a moment ago may not have reached this worker's copy yet),
+        # but never in Postgres
+        known = code_filter.might_contain(short_url)
 
-        user_agent_string = request.headers.get("user-agent")
-        accept = request.headers.get("accept", "").lower()
+        # One Redis round trip when the record is cached; Postgres only on a miss
+        event = visit_service.visit_event(request, short_url)
+        with phase("redis"):
+            status, shortened_url = await redirect_lookup.run(
+                redis, short_url, url_cache.local.get(short_url), event, now
+            )
+        if status == redirect_lookup.KNOWN_MISSING:
+            raise HTTPException(status_code=404, detail=NOT_FOUND_DETAIL)
 
-        await visit_service.log_visit(
-            db=db,
-            request=request,
-            short_code=shortened_url.short_url
-        )
+        if status == redirect_lookup.MISS and not known:
+            BLOOM_REJECT.inc()
+            raise HTTPException(status_code=404, detail=NOT_FOUND_DETAIL)
+
+        if status == redirect_lookup.MISS:
+            statement = select(ShortenedUrl).where(ShortenedUrl.short_url == short_url)
+            with phase("db"):
+                result = await db.execute(statement)
+                db_url = result.scalar_one_or_none()
+                # Everything below is Redis; don't hold the connection while it runs
+                await release(db)
+
+            if not db_url:
+                with phase("redis"):
+                    await code_filter.remember_missing(redis, short_url)
+                raise HTTPException(status_code=404, detail=NOT_FOUND_DETAIL)
+
+            # Expired rows are flagged and reclaimed by services.expiry_sweeper, never
+            # here; the tombstone answers the next hits without Postgres
+            if db_url.expired or (db_url.expires_at and db_url.expires_at < now):
+                with phase("redis"):
+                    await code_filter.remember_expired(redis, [short_url])
+                raise HTTPException(status_code=404, detail=EXPIRED_DETAIL)
+
+            shortened_url = url_cache.from_model(db_url)
+            with phase("redis"):
+                await url_cache.set(redis, shortened_url, now)
+                await click_counter.seed(redis, short_url, db_url.click_count, url_cache.ttl_for(shortened_url, now))
+                status, _ = await redirect_lookup.run(redis, short_url, shortened_url, event, now)
+
+        if status == redirect_lookup.EXPIRED:
+            raise HTTPException(status_code=404, detail=EXPIRED_DETAIL)
+
+        if status == redirect_lookup.UNSEEDED:
+            with phase("db"):
+                result = await db.execute(
+                    select(ShortenedUrl.click_count).where(ShortenedUrl.short_url == short_url)
+                )
+                click_count = result.scalar_one_or_none()
+                await release(db)
+            with phase("redis"):
+                if click_count is None:
+                    await url_cache.delete(redis, short_url)
+                    raise HTTPException(status_code=404, detail=NOT_FOUND_DETAIL)
+                await click_counter.seed(redis, short_url, click_count, url_cache.ttl_for(shortened_url, now))
+                status, _ = await redirect_lookup.run(redis, short_url, shortened_url, event, now)
+
+        if status == redirect_lookup.EXHAUSTED:
+            raise HTTPException(status_code=404, detail=CLICK_LIMIT_DETAIL)
+
+        return shortened_url
+
+    async def redirect_to_main_url(self, db: AsyncSession, redis: Redis, short_url: str, request: Request) -> RedirectResponse | JSONResponse:
+        try:
+            shortened_url = await self.resolve(db, redis, short_url, request)
+        except HTTPException as exc:
+            REDIRECTS.labels(REDIRECT_OUTCOMES.get(exc.detail, "error")).inc()
+            raise
+        except Exception:
+            REDIRECTS.labels("error").inc()
+            raise
+        REDIRECTS.labels("hit").inc()
+
+        user_agent_string = request.headers.get("user-agent", "")
+        accept = request.headers.get("accept", "").lower()
 
         is_swagger = "swagger" in user_agent_string.lower() or "json" in accept
 
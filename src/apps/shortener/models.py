@@ -5,12 +5,21 @@ from sqlmodel import SQLModel, Field
 from typing import Optional
 from sqlalchemy import Column, DateTime, func
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, String, Integer, DateTime, func, UniqueConstraint
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, func, UniqueConstraint, Sequence, Index, text
 from datetime import datetime
 
 
+# Source of ids for services.code_allocator.SequenceCodeAllocator
+short_code_seq = Sequence("short_code_seq", metadata=SQLModel.metadata)
+
 class ShortenedUrl(SQLModel, table=True):
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        # Lets the expiry sweeper find flagged rows that are due for deletion
+        Index("ix_shortenedurl_expired_updated_at", "updated_at", postgresql_where=text("expired")),
+        # Lets startup's cache warm-up read the most-clicked live links without a full sort
+        Index("ix_shortenedurl_live_click_count", "click_count", postgresql_where=text("active AND NOT expired")),
+        {"extend_existing": True},
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     main_url: str = Field(nullable=False)
@@ -22,13 +31,23 @@ class ShortenedUrl(SQLModel, table=True):
     expired: bool = Field(default=False)
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
     updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
-    expires_at: Optional[datetime] = Field(default=None)
+    expires_at: Optional[datetime] = Field(default=None, index=True)
 
 
 class VisitLog(SQLModel, table=True):
-    __table_args__ = {"extend_existing": True}
+    # Range-partitioned by month on visited_at; partitions are created and retired
+    # by services.partition_maintenance. Postgres requires the partition key in the
+    # primary key, hence (id, visited_at).
+    __table_args__ = (
+        Index("ix_visitlog_client_ip_visited_at", "client_ip", "visited_at"),
+        Index("ix_visitlog_short_url_visited_at", "short_url", "visited_at"),
+        {"extend_existing": True, "postgresql_partition_by": "RANGE (visited_at)"},
+    )
 
-    id: Optional[int] = Field(default=None, primary_key=True)
+    id: Optional[int] = Field(
+        default=None,
+        sa_column=Column(BigInteger, primary_key=True, autoincrement=True),
+    )
     short_url: str = Field(nullable=False)
     client_ip: str = Field(nullable=False)
     system_id: Optional[str] = None
@@ -39,8 +58,34 @@ class VisitLog(SQLModel, table=True):
     device: Optional[str] = None
     os: Optional[str] = None
     browser: Optional[str] = None
-    visited_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
-    created_at: Optional[datetime] = Field(default_factory=datetime.utcnow, nullable=False)
+    visited_at: datetime = Field(default_factory=datetime.utcnow, primary_key=True)
+    # Set by Postgres when the row is inserted; services.visit_rollup's lag is measured from it
+    created_at: Optional[datetime] = Field(
+        default=None,
+        nullable=False,
+        sa_column_kwargs={"server_default": text("timezone('utc', now())")},
+    )
+
+
+class VisitRollup(SQLModel, table=True):
+    # Clicks per link, hour/day bucket and VisitLog dimension value, maintained by
+    # services.visit_rollup from VisitLog rows past the "visit-rollup" watermark
+    __table_args__ = {"extend_existing": True}
+
+    short_url: str = Field(primary_key=True)
+    granularity: str = Field(primary_key=True)  # "hour" or "day"
+    dimension: str = Field(primary_key=True)  # "country", "device", "os" or "browser"
+    bucket: datetime = Field(primary_key=True)
+    value: str = Field(primary_key=True)
+    clicks: int = Field(default=0, nullable=False)
+
+
+class RollupWatermark(SQLModel, table=True):
+    __table_args__ = {"extend_existing": True}
+
+    name: str = Field(primary_key=True)
+    last_id: int = Field(default=0, sa_type=BigInteger, nullable=False)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
 
 Base = declarative_base()
 
@@ -1,7 +1,7 @@
 import re
-from pydantic import BaseModel, field_validator, HttpUrl, AnyHttpUrl
+from pydantic import BaseModel, ConfigDict, field_validator, HttpUrl, AnyHttpUrl
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from apps.shortener.enums import ExpirationUnitEnum
 from pydantic import BaseModel
 from datetime import datetime
@@ -54,6 +54,90 @@ class ShortenUrlResponse(BaseModel):
     updated_at: str
     expires_at: str
 
+
+class ShortenBatchItemResult(BaseModel):
+    index: int
+    result: Optional[ShortenUrlResponse] = None
+    error: Optional[str] = None
+
+
+class ShortenBatchResponse(BaseModel):
+    created: int
+    failed: int
+    items: List[ShortenBatchItemResult]
+
+
+class CachedShortenedUrl(BaseModel):
+    main_url: str
+    short_url: str
+    custom_domain: Optional[str] = None
+    max_clicks: Optional[int] = None
+    expires_at: Optional[datetime] = None
+
+class VisitLogRead(BaseModel):
+    # Built from VisitLog rows
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    short_url: str
+    client_ip: str
+    system_id: Optional[str] = None
+    city: Optional[str] = None
+    country: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    device: Optional[str] = None
+    os: Optional[str] = None
+    browser: Optional[str] = None
+    visited_at: datetime
+    created_at: Optional[datetime] = None
+
+
+class VisitLogPage(BaseModel):
+    client_ip: str
+    visit_logs: List[VisitLogRead]
+    next_cursor: Optional[str] = None
+
+
+# Response models for the campaign lists. The endpoints return ORM rows, which
+# FastAPI validates against these (from_attributes) and serializes in
+# pydantic-core, instead of walking every row with jsonable_encoder.
+class CampaignSourceRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    unique_id: str
+    user_id: str
+    campaign_source_tag: str
+    campaign_source_name: str
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class CampaignMediumRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    unique_id: str
+    user_id: str
+    campaign_medium_tag: str
+    campaign_medium_name: str
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class CampaignNameRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    unique_id: str
+    user_id: str
+    campaign_name_tag: str
+    campaign_name: str
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
 class CampaignSourceCreate(BaseModel):
     user_id: str
     campaign_source_tag: str
@@ -0,0 +1,125 @@
+# src/benchmarks/envelope_overhead.py
+# Run from src/:  python -m benchmarks.envelope_overhead [--requests N]
+#
+# Per-request cost of the {details, status_code} response envelope: the old
+# buffering middleware (drain body, json.loads, ResponseStructure,
+# jsonable_encoder, serialize again) against ResponseEnvelopeMiddleware, for a
+# small object and for a list endpoint sized like a page of visit logs.
+import argparse
+import asyncio
+import json
+import time
+from typing import Callable
+
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from middlewares.response_schema import response_schema_middleware
+from utils.responses import ResponseStructure
+
+SMALL = {"short_url": "aB3xZ", "click_count": 1234}
+PAGE = [
+    {
+        "id": i,
+        "short_url": "aB3xZ",
+        "client_ip": "203.0.113.7",
+        "city": "Mumbai",
+        "country": "India",
+        "device": "Mobile",
+        "os": "Android",
+        "browser": "Chrome Mobile",
+        "visited_at": "2026-10-18T12:00:00",
+    }
+    for i in range(1000)
+]
+
+
+def buffering_envelope(app: FastAPI):
+    # The previous response_schema_middleware, kept here as the baseline
+    @app.middleware("http")
+    async def wrap_response(request: Request, call_next: Callable):
+        response = await call_next(request)
+        full_body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = dict(response.headers)
+        headers.pop("content-length", None)
+        if response.headers.get("content-type", "").startswith("application/json"):
+            structured_response = ResponseStructure(
+                details=json.loads(full_body.decode()),
+                status_code=response.status_code,
+            )
+            return JSONResponse(
+                content=jsonable_encoder(structured_response),
+                status_code=response.status_code,
+                headers=headers,
+            )
+        return Response(content=full_body, status_code=response.status_code, headers=headers)
+
+
+def build_app(install: Callable[[FastAPI], object]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/small")
+    async def small():
+        return SMALL
+
+    @app.get("/page")
+    async def page():
+        return PAGE
+
+    install(app)
+    return app
+
+
+async def call(app: FastAPI, path: str) -> bytes:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "headers": [],
+        "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000),
+    }
+    chunks = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(chunks)
+
+
+async def measure(app: FastAPI, path: str, requests: int) -> float:
+    for _ in range(min(requests, 200)):  # warm up
+        await call(app, path)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await call(app, path)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def main(requests: int):
+    apps = {
+        "none": build_app(lambda app: None),
+        "buffering": build_app(buffering_envelope),
+        "asgi": build_app(response_schema_middleware),
+    }
+    for path in ("/small", "/page"):
+        assert json.loads(await call(apps["buffering"], path)) == json.loads(await call(apps["asgi"], path))
+
+    print(f"{'endpoint':<8} {'no envelope':>12} {'buffering':>12} {'asgi':>12} {'overhead removed':>17}")
+    for path, label in (("/small", "small"), ("/page", "page")):
+        timings = {name: await measure(app, path, requests) for name, app in apps.items()}
+        removed = timings["buffering"] - timings["asgi"]
+        print(
+            f"{label:<8} {timings['none']:>10.1f}us {timings['buffering']:>10.1f}us "
+            f"{timings['asgi']:>10.1f}us {removed:>15.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Response envelope overhead benchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    asyncio.run(main(parser.parse_args().requests))
@@ -0,0 +1,94 @@
+# src/benchmarks/json_serialization.py
+# Run from src/:  python -m benchmarks.json_serialization [--rows N] [--repeat N]
+#
+# Cost of turning one page of VisitLog ORM rows into response bytes, the way
+# FastAPI does it for each configuration:
+#   stdlib   - no response_model: jsonable_encoder, then JSONResponse (json.dumps)
+#   model    - response_model=VisitLogPage validated/serialized by pydantic-core, then json.dumps
+#   orjson   - response_model as above, rendered by FastJSONResponse (APP_FAST_JSON)
+#   direct   - the ORM rows handed straight to FastJSONResponse (no response_model)
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from apps.shortener.models import VisitLog
+from apps.shortener.schemas import VisitLogPage
+from utils.responses import FastJSONResponse
+
+page_adapter = TypeAdapter(VisitLogPage)
+
+
+def build_rows(count: int) -> List[VisitLog]:
+    started = datetime(2026, 10, 18, 12, 0, 0)
+    return [
+        VisitLog(
+            id=i,
+            short_url="aB3xZ",
+            client_ip="203.0.113.7",
+            system_id="host-1",
+            city="Mumbai",
+            country="India",
+            latitude=19.076,
+            longitude=72.8777,
+            device="Mobile",
+            os="Android",
+            browser="Chrome Mobile",
+            visited_at=started - timedelta(seconds=i),
+            created_at=started,
+        )
+        for i in range(count)
+    ]
+
+
+def page(rows: List[VisitLog]) -> dict:
+    return {"client_ip": "203.0.113.7", "visit_logs": rows, "next_cursor": None}
+
+
+def via_model(rows: List[VisitLog]):
+    # What FastAPI's serialize_response does with a response_model
+    content = page([row.model_dump() for row in rows])
+    return page_adapter.dump_python(page_adapter.validate_python(content), mode="json")
+
+
+STRATEGIES = {
+    "stdlib": lambda rows: JSONResponse(jsonable_encoder(page(rows))).body,
+    "model": lambda rows: JSONResponse(via_model(rows)).body,
+    "orjson": lambda rows: FastJSONResponse(via_model(rows)).body,
+    "direct": lambda rows: FastJSONResponse(page(rows)).body,
+}
+
+
+def measure(strategy: Callable, rows: List[VisitLog], repeat: int) -> float:
+    strategy(rows)  # warm up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        strategy(rows)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main(row_count: int, repeat: int):
+    rows = build_rows(row_count)
+    expected = json.loads(STRATEGIES["stdlib"](rows))
+    for name, strategy in STRATEGIES.items():
+        assert json.loads(strategy(rows)) == expected, f"{name} output differs"
+
+    baseline = None
+    print(f"{row_count} VisitLog rows per response, {repeat} iterations")
+    for name, strategy in STRATEGIES.items():
+        micros = measure(strategy, rows, repeat)
+        baseline = baseline or micros
+        print(f"{name:<8} {micros:>10.1f}us  {baseline / micros:>5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Response serialization micro-benchmark")
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
@@ -0,0 +1,257 @@
+# src/benchmarks/load_test.py
+# Run from src/:  python -m benchmarks.load_test --scenario warm [--requests N]
+#                     [--concurrency N] [--keys N] [--zipf S] [--url URL] [--fake-redis]
+#
+# End-to-end throughput and latency of the redirect and shorten paths.
+#
+# By default the app is driven in-process through httpx's ASGI transport, with
+# no network or server in between. It uses the Postgres and Redis from
+# src/.env. Point those at scratch instances: the run writes links and visit
+# events. With --fake-redis, Redis is an in-memory fakeredis instead. It runs
+# Lua in-process and is far slower than Redis, so only compare results that
+# used the same backend (recorded in the JSON). --url sends the same traffic
+# over HTTP to a running server; it must share the Redis and Postgres this
+# script seeds.
+#
+# Scenarios (key popularity follows a Zipf distribution with exponent --zipf):
+#   warm           links cached in Redis and in the worker's L1
+#   cold           links only in Postgres: early requests miss and fill the caches
+#   click-limited  links with --max-clicks each, so hot keys run out and 404
+#   bot-404        codes that were never issued (Bloom filter / negative cache)
+#   shorten        POST /shorten with new URLs
+# cold and shorten need Postgres.
+#
+# The result (throughput, p50/p95/p99 latency, status counts) is written as
+# JSON to --out, by default benchmarks/results/<scenario>-<time>.json.
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import secrets
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+from apps.shortener.models import ShortenedUrl
+from apps.shortener.schemas import CachedShortenedUrl
+from core.config import code_filter_config
+from services.click_counter import click_counter
+from services.code_filter import code_filter
+from services.database import async_session
+from services.url_cache import url_cache
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+SCENARIOS = {
+    "warm": "core.redirect_app:app",
+    "cold": "core.redirect_app:app",
+    "click-limited": "core.redirect_app:app",
+    "bot-404": "core.redirect_app:app",
+    "shorten": "core.main:app",
+}
+
+
+def zipf_keys(keys: List[str], exponent: float, count: int, rng: random.Random) -> List[str]:
+    # Rank k is requested with weight 1 / k**exponent
+    cum_weights = list(itertools.accumulate(1 / rank ** exponent for rank in range(1, len(keys) + 1)))
+    return rng.choices(keys, cum_weights=cum_weights, k=count)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def use_fake_redis():
+    import fakeredis  # dev dependency; not installed with poetry install --only main
+    from services import redis as redis_service
+
+    redis_service.redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+async def ensure_filter(redis, codes: List[str]):
+    # A fresh Redis has no Bloom filter yet (the app builds it from Postgres on
+    # boot); size an empty one so the seeded codes can be added to it
+    if not await redis.exists(code_filter.META_KEY):
+        size_bits, hash_count = code_filter.sizing(max(len(codes) * 2, code_filter_config.expected_items))
+        await redis.hset(code_filter.META_KEY, mapping={"size_bits": size_bits, "hash_count": hash_count})
+    await code_filter.add(redis, codes)
+
+
+async def seed_redis(redis, codes: List[str], max_clicks: Optional[int]):
+    # What ShortenerController.shorten_batch does once its rows are committed
+    now = datetime.utcnow()
+    records = [
+        CachedShortenedUrl(main_url=f"https://example.com/{code}", short_url=code, max_clicks=max_clicks)
+        for code in codes
+    ]
+    await url_cache.set_many(redis, records, now)
+    await click_counter.seed_many(redis, {record.short_url: url_cache.ttl_for(record, now) for record in records})
+    await ensure_filter(redis, codes)
+
+
+async def seed_postgres(redis, codes: List[str]):
+    now = datetime.utcnow()
+    async with async_session() as db:
+        db.add_all([
+            ShortenedUrl(
+                main_url=f"https://example.com/{code}", short_url=code, created_at=now, updated_at=now
+            )
+            for code in codes
+        ])
+        await db.commit()
+    await ensure_filter(redis, codes)
+
+
+async def prepare(scenario: str, redis, codes: List[str], max_clicks: int):
+    url_cache.local.clear()
+    if scenario == "warm":
+        await seed_redis(redis, codes, None)
+    elif scenario == "click-limited":
+        await seed_redis(redis, codes, max_clicks)
+    elif scenario == "bot-404":
+        await seed_redis(redis, codes, None)
+    elif scenario == "cold":
+        await seed_postgres(redis, codes)
+
+
+def build_requests(scenario: str, codes: List[str], args, rng: random.Random) -> List[dict]:
+    if scenario == "shorten":
+        return [
+            {"method": "POST", "url": "/shorten", "json": {"main_url": f"https://example.com/{rng.getrandbits(64):x}"}}
+            for _ in range(args.requests)
+        ]
+    if scenario == "bot-404":
+        targets = [f"bot{secrets.token_hex(5)}" for _ in range(args.requests)]
+    else:
+        targets = zipf_keys(codes, args.zipf, args.requests, rng)
+    return [{"method": "GET", "url": f"/{code}"} for code in targets]
+
+
+async def drive(client: httpx.AsyncClient, requests: List[dict], concurrency: int):
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    pending = iter(requests)
+
+    async def worker():
+        for request in pending:
+            started = time.perf_counter()
+            try:
+                response = await client.request(**request)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args) -> dict:
+    rng = random.Random(args.seed)
+    app_path = args.app or SCENARIOS[args.scenario]
+    if args.fake_redis:
+        await use_fake_redis()
+
+    from services.redis import get_redis
+    redis = await get_redis()
+    run_id = secrets.token_hex(2)
+    codes = [f"lt{run_id}{i:06d}" for i in range(args.keys)]
+    await prepare(args.scenario, redis, codes, args.max_clicks)
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, follow_redirects=False, timeout=30)
+    else:
+        module_name, attribute = app_path.split(":")
+        app = getattr(__import__(module_name, fromlist=[attribute]), attribute)
+        client = httpx.AsyncClient(
+            # Unhandled errors count as 500s, as they would behind a server
+            transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+            base_url="http://bench",
+            follow_redirects=False,
+        )
+
+    async with client:
+        if args.scenario == "warm":
+            # One pass over every key fills the L1 the way live traffic would
+            await drive(client, [{"method": "GET", "url": f"/{code}"} for code in codes], args.concurrency)
+        latencies, statuses, elapsed = await drive(
+            client, build_requests(args.scenario, codes, args, rng), args.concurrency
+        )
+
+    ordered = sorted(latencies)
+    return {
+        "scenario": args.scenario,
+        "target": args.url or f"in-process {app_path}",
+        "redis": "fakeredis" if args.fake_redis else "configured",
+        "commit": git_commit(),
+        "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "keys": args.keys,
+            "zipf": args.zipf,
+            "max_clicks": args.max_clicks,
+            "seed": args.seed,
+        },
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.fmean(ordered) * 1000, 3),
+            "p50": round(percentile(ordered, 0.50) * 1000, 3),
+            "p95": round(percentile(ordered, 0.95) * 1000, 3),
+            "p99": round(percentile(ordered, 0.99) * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3),
+        },
+        "status_counts": dict(sorted(statuses.items())),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Redirect / shorten load test")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="warm")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--keys", type=int, default=10000, help="distinct links seeded")
+    parser.add_argument("--zipf", type=float, default=1.1, help="popularity skew; 0 = uniform")
+    parser.add_argument("--max-clicks", type=int, default=5, help="budget per link for click-limited")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--app", help="module:attribute to drive in-process (default per scenario)")
+    parser.add_argument("--url", help="drive a running server instead, e.g. http://127.0.0.1:8001")
+    parser.add_argument("--fake-redis", action="store_true", help="in-memory fakeredis instead of Redis")
+    parser.add_argument("--out", help="result file (default benchmarks/results/<scenario>-<time>.json)")
+    args = parser.parse_args()
+
+    result = asyncio.run(main(args))
+    out = args.out or os.path.join(
+        RESULTS_DIR, f"{args.scenario}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+
+    latency = result["latency_ms"]
+    print(
+        f"{result['scenario']}: {result['throughput_rps']} req/s over {result['duration_s']}s  "
+        f"p50 {latency['p50']}ms  p95 {latency['p95']}ms  p99 {latency['p99']}ms  "
+        f"statuses {result['status_counts']}"
+    )
+    print(f"wrote {out}")
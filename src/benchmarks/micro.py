@@ -0,0 +1,239 @@
+# src/benchmarks/micro.py
+# Run from src/:  python -m benchmarks.micro [-k NAME] [--save FILE]
+#                     [--baseline FILE] [--threshold 0.10]
+#
+# Isolated timings of code that runs on every request (or on every visit in
+# the ingest worker), in nanoseconds per call:
+#   random_code        utils.random_utils.generate_random_characters
+#   shorten_request    ShortenUrlRequest validation (the main_url / custom_domain regexes)
+#   utc_to_ist         ShortenerController.utc_to_ist (pytz.timezone on every call)
+#   build_response     ShortenerController.build_response (three utc_to_ist + strftime)
+#   ua_parse           UserAgentService.parse (user_agents.parse), no cache
+#   envelope           ResponseEnvelopeMiddleware around a small JSON response
+#   visitlog_orm       VisitLog(...) construction, as the ingest worker used to build rows
+#   phase_timer        services.timing.phase around an empty block
+#
+# --save writes the results as JSON. --baseline compares against such a file
+# (e.g. saved on the parent commit) and exits 1 if any benchmark got slower by
+# more than --threshold, so CPU regressions fail CI instead of going unnoticed.
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from apps.shortener.controllers import ShortenerController
+from apps.shortener.models import ShortenedUrl, VisitLog
+from apps.shortener.schemas import ShortenUrlRequest
+from core.config import short_code_config
+from middlewares.response_schema import ResponseEnvelopeMiddleware
+from services.timing import phase
+from services.user_agent_service import UserAgentService
+from utils.random_utils import generate_random_characters
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_4) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15",
+    "Googlebot/2.1 (+http://www.google.com/bot.html)",
+]
+
+# name -> setup function returning run(loops), which returns the seconds those loops took
+BENCHMARKS: Dict[str, Callable[[], Callable[[int], float]]] = {}
+
+
+def benchmark(name: str):
+    def register(make: Callable[[], Callable]):
+        BENCHMARKS[name] = make
+        return make
+    return register
+
+
+def timed(fn: Callable[[], object]) -> Callable[[int], float]:
+    def run(loops: int) -> float:
+        started = time.perf_counter()
+        for _ in itertools.repeat(None, loops):
+            fn()
+        return time.perf_counter() - started
+    return run
+
+
+def timed_async(fn: Callable[[], object]) -> Callable[[int], float]:
+    # The loop is inside the coroutine so the event loop's own overhead isn't measured
+    loop = asyncio.new_event_loop()
+
+    async def batch(loops: int) -> float:
+        started = time.perf_counter()
+        for _ in itertools.repeat(None, loops):
+            await fn()
+        return time.perf_counter() - started
+
+    return lambda loops: loop.run_until_complete(batch(loops))
+
+
+@benchmark("random_code")
+def random_code():
+    return timed(lambda: generate_random_characters(short_code_config.min_length))
+
+
+@benchmark("shorten_request")
+def shorten_request():
+    payload = {
+        "main_url": "www.example.com/some/landing-page?utm_source=newsletter",
+        "custom_domain": "https://links.example.org",
+        "max_clicks": 100,
+    }
+    return timed(lambda: ShortenUrlRequest.model_validate(payload))
+
+
+@benchmark("utc_to_ist")
+def utc_to_ist():
+    now = datetime.utcnow()
+    return timed(lambda: ShortenerController.utc_to_ist(now))
+
+
+@benchmark("build_response")
+def build_response():
+    now = datetime.utcnow()
+    row = ShortenedUrl(
+        main_url="https://www.example.com/landing", short_url="aB3xZ", custom_domain="127.0.0.1:8000",
+        created_at=now, updated_at=now, expires_at=now + timedelta(hours=1),
+    )
+    controller = ShortenerController()
+    return timed(lambda: controller.build_response(row))
+
+
+@benchmark("ua_parse")
+def ua_parse():
+    user_agents = itertools.cycle(USER_AGENTS)
+    return timed(lambda: UserAgentService.parse(next(user_agents)))
+
+
+@benchmark("envelope")
+def envelope():
+    body = b'{"short_url":"aB3xZ","click_count":1234}'
+    start = {
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    }
+
+    async def endpoint(scope, receive, send):
+        await send(dict(start, headers=list(start["headers"])))
+        await send({"type": "http.response.body", "body": body, "more_body": False})
+
+    async def discard(message):
+        pass
+
+    middleware = ResponseEnvelopeMiddleware(endpoint)
+    scope = {"type": "http", "path": "/stats/aB3xZ"}
+    return timed_async(lambda: middleware(scope, None, discard))
+
+
+@benchmark("visitlog_orm")
+def visitlog_orm():
+    now = datetime.utcnow()
+    return timed(lambda: VisitLog(
+        short_url="aB3xZ", client_ip="203.0.113.7", system_id="host-1", city="Mumbai",
+        country="India", latitude=19.076, longitude=72.8777, device="Mobile", os="Android",
+        browser="Chrome Mobile", visited_at=now,
+    ))
+
+
+@benchmark("phase_timer")
+def phase_timer():
+    def empty_phase():
+        with phase("bench"):
+            pass
+    return timed(empty_phase)
+
+
+def measure(run: Callable[[int], float], repeat: int, min_time: float) -> dict:
+    # Calibrate like timeit.autorange: grow the loop count until one sample takes min_time
+    loops = 1
+    while run(loops) < min_time:
+        loops *= 10
+    samples = [run(loops) / loops * 1e9 for _ in range(repeat)]
+    return {
+        "ns_per_op": round(statistics.median(samples), 1),
+        "min_ns_per_op": round(min(samples), 1),
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> int:
+    regressions = 0
+    print(f"\n{'benchmark':<16} {'baseline':>12} {'now':>12} {'change':>8}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<16} {'-':>12} {result['ns_per_op']:>10.1f}ns {'new':>8}")
+            continue
+        change = result["ns_per_op"] / before["ns_per_op"] - 1
+        flag = ""
+        if change > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(
+            f"{name:<16} {before['ns_per_op']:>10.1f}ns {result['ns_per_op']:>10.1f}ns "
+            f"{change:>+7.1%}{flag}"
+        )
+    return regressions
+
+
+def main(args) -> int:
+    selected = [name for name in BENCHMARKS if not args.k or any(k in name for k in args.k)]
+    results = {}
+    print(f"{'benchmark':<16} {'median':>12} {'min':>12}")
+    for name in selected:
+        results[name] = measure(BENCHMARKS[name](), args.repeat, args.min_time)
+        print(f"{name:<16} {results[name]['ns_per_op']:>10.1f}ns {results[name]['min_ns_per_op']:>10.1f}ns")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "commit": git_commit(),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+                "results": results,
+            }, f, indent=2)
+        print(f"wrote {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"{regressions} benchmark(s) slower than {baseline.get('commit') or args.baseline} "
+                  f"by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-request CPU micro-benchmarks")
+    parser.add_argument("-k", action="append", help="only benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.1, help="seconds per sample")
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown, 0.10 = 10%%")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,90 @@
+# src/benchmarks/startup_time.py
+# Run from src/:  python -m benchmarks.startup_time [--app core.main:app] [--runs N]
+#                     [--lifespan] [--max-ms N]
+#
+# Cold start of one worker, each run in a fresh interpreter the way gunicorn
+# boots it:
+#   import   - importing the app module (models, routers, config, middleware)
+#   startup  - the lifespan startup: DDL or the Alembic check, pool and cache
+#              warm-up, background tasks (--lifespan; needs Postgres and Redis)
+# With --max-ms the exit status is 1 when the median import + startup is over
+# budget, so CI catches cold-start regressions.
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+CHILD = r"""
+import asyncio, importlib, json, sys, time
+
+module_name, attribute = sys.argv[1].split(":")
+started = time.perf_counter()
+app = getattr(importlib.import_module(module_name), attribute)
+timings = {"import": (time.perf_counter() - started) * 1000}
+
+
+async def lifespan():
+    messages = asyncio.Queue()
+    await messages.put({"type": "lifespan.startup"})
+    replies = asyncio.Queue()
+    scope = {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}
+    server = asyncio.create_task(app(scope, messages.get, replies.put))
+
+    started = time.perf_counter()
+    reply = await replies.get()
+    timings["startup"] = (time.perf_counter() - started) * 1000
+    if reply["type"] != "lifespan.startup.complete":
+        raise SystemExit(f"startup failed: {reply.get('message', '')}")
+    await messages.put({"type": "lifespan.shutdown"})
+    await replies.get()
+    await server
+
+
+if sys.argv[2] == "1":
+    asyncio.run(lifespan())
+print(json.dumps(timings))
+"""
+
+
+def run_once(app: str, lifespan: bool) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, app, "1" if lifespan else "0"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(result.stderr.strip() or result.stdout.strip())
+    # The app may log to stdout; the timings are the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(app: str, runs: int, lifespan: bool, max_ms: float = None) -> int:
+    samples = [run_once(app, lifespan) for _ in range(runs)]
+    phases = ["import", "startup"] if lifespan else ["import"]
+
+    print(f"{app}, {runs} cold starts")
+    print(f"{'phase':<8} {'median':>10} {'min':>10} {'max':>10}")
+    for phase in phases:
+        values = [sample[phase] for sample in samples]
+        print(
+            f"{phase:<8} {statistics.median(values):>8.1f}ms {min(values):>8.1f}ms "
+            f"{max(values):>8.1f}ms"
+        )
+
+    total = statistics.median(sum(sample[phase] for phase in phases) for sample in samples)
+    print(f"{'total':<8} {total:>8.1f}ms")
+    if max_ms is not None and total > max_ms:
+        print(f"cold start over budget: {total:.1f}ms > {max_ms:.1f}ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker cold-start benchmark")
+    parser.add_argument("--app", default="core.main:app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--lifespan", action="store_true")
+    parser.add_argument("--max-ms", type=float)
+    args = parser.parse_args()
+    sys.exit(main(args.app, args.runs, args.lifespan, args.max_ms))
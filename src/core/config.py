@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings as PydanticBaseConfig
 
 
@@ -12,6 +12,8 @@ class AppConfig(BaseConfig):
     secret_key: str = "secret_key"
     default_domain: str = "http://127.0.0.1:8000"
     debug: bool = True
+    environment: Literal["development", "production"] = "development"  # production: no DDL on startup
+    fast_json: bool = True  # render JSON responses with orjson instead of the stdlib encoder
 
     model_config = {
         "env_prefix": "APP_",
@@ -58,7 +60,8 @@ class RedisCpConfig(BaseConfig):
     database: int = 0
     max_connections: int = 10
     decode_responses: bool = True
-    
+    pool_timeout: float = 5.0  # seconds to wait for a free connection
+    health_check_interval: int = 30  # PING connections idle for longer than this
 
     @property
     def redis_url(self) -> str:
@@ -74,3 +77,246 @@ class RedisCpConfig(BaseConfig):
     }
 
 redis_config = RedisCpConfig()
+
+
+class ClickCounterConfig(BaseConfig):
+    flush_interval: float = 5.0  # seconds between batched click_count UPDATEs
+    flush_batch_size: int = 1000
+    orphan_after: float = 60.0  # seconds before another worker reclaims a stalled flush
+
+    model_config = {
+        "env_prefix": "CLICKS_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+click_counter_config = ClickCounterConfig()
+
+
+class VisitIngestConfig(BaseConfig):
+    stream_key: str = "visits:stream"
+    group: str = "visit-ingest"
+    batch_size: int = 2000  # events per XREADGROUP and per multi-row INSERT
+    block_ms: int = 1000
+    claim_idle_ms: int = 60000  # re-deliver events a crashed consumer never acked
+    max_deliveries: int = 5  # after this many attempts an event is moved to the dead-letter stream
+    max_length: int = 1_000_000  # approximate cap (XADD MAXLEN ~); the oldest events are dropped past it
+    metrics_port: int = 0  # serve the worker's Prometheus metrics (enrichment phases) here; 0 = off
+
+    model_config = {
+        "env_prefix": "VISITS_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+visit_ingest_config = VisitIngestConfig()
+
+
+class GeoConfig(BaseConfig):
+    database_path: str = "data/GeoLite2-City.mmdb"  # MaxMind City or Country .mmdb, relative to src/
+    cache_size: int = 100_000
+    ipv4_prefix: int = 24  # lookups are cached per network, not per address
+    ipv6_prefix: int = 48
+    reload_check_interval: float = 60.0  # seconds between checks for a replaced database file
+
+    model_config = {
+        "env_prefix": "GEO_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+geo_config = GeoConfig()
+
+
+class UserAgentConfig(BaseConfig):
+    cache_size: int = 10_000  # distinct UA strings kept per process
+    redis_tier: bool = False  # share classifications between workers through Redis
+    redis_ttl: int = 7 * 24 * 60 * 60
+
+    model_config = {
+        "env_prefix": "UA_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+user_agent_config = UserAgentConfig()
+
+
+class ShortCodeConfig(BaseConfig):
+    allocator: str = "sequence"  # "sequence" or "random" (legacy SELECT-and-retry)
+    min_length: int = 5  # codes grow by one character once this length is used up
+    block_size: int = 1000  # sequence ids reserved per round trip
+    feistel_rounds: int = 4
+    key: Optional[str] = None  # permutation key, defaults to APP_SECRET_KEY; never change it once codes exist
+
+    model_config = {
+        "env_prefix": "SHORTCODE_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+short_code_config = ShortCodeConfig()
+
+
+class UrlCacheConfig(BaseConfig):
+    l1_ttl: float = 60.0  # seconds a worker serves a record from memory
+    l1_max_entries: int = 100_000
+    l1_max_bytes: int = 64 * 1024 * 1024
+
+    model_config = {
+        "env_prefix": "URL_CACHE_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+url_cache_config = UrlCacheConfig()
+
+
+class CodeFilterConfig(BaseConfig):
+    enabled: bool = True
+    expected_items: int = 1_000_000  # minimum capacity; sized for 2x the live codes at rebuild
+    false_positive_rate: float = 0.01
+    negative_ttl: int = 60  # seconds an unknown code that passed the filter is remembered
+    expired_ttl: int = 3600  # seconds an expired code is remembered; reissuing the code clears it
+    rebuild_lock_ttl: int = 300  # workers booting within this window reuse the last rebuild
+
+    model_config = {
+        "env_prefix": "CODE_FILTER_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+code_filter_config = CodeFilterConfig()
+
+
+class SweeperConfig(BaseConfig):
+    interval: float = 60.0  # seconds between sweeps
+    batch_size: int = 1000
+    max_batches: int = 50  # per phase and sweep, so one run stays bounded
+    delete_after: int = 7 * 24 * 60 * 60  # seconds a flagged row is kept; 0 keeps them forever
+    lock_ttl: int = 300
+
+    model_config = {
+        "env_prefix": "SWEEPER_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+sweeper_config = SweeperConfig()
+
+
+class ShortenBatchConfig(BaseConfig):
+    max_items: int = 50_000  # per POST /shorten/batch request
+    lookup_chunk_size: int = 10_000  # custom codes checked per query
+
+    model_config = {
+        "env_prefix": "SHORTEN_BATCH_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+shorten_batch_config = ShortenBatchConfig()
+
+
+class ClickStatsConfig(BaseConfig):
+    max_points: int = 2000  # buckets returned by one /stats time-series query
+    default_days: int = 30  # range used when only part of from/to is given (day buckets)
+    default_hours: int = 48  # same, for hour buckets
+    hour_retention_days: int = 14  # hour buckets kept in Redis; older hours are counted from VisitLog
+
+    model_config = {
+        "env_prefix": "STATS_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+click_stats_config = ClickStatsConfig()
+
+
+class RollupConfig(BaseConfig):
+    interval: float = 30.0  # seconds between rollup runs
+    lag: int = 30  # seconds since a VisitLog row was inserted before it is rolled up; keep above the longest ingest transaction
+    batch_size: int = 50_000  # VisitLog ids per transaction
+    max_batches: int = 20  # per run, so one run stays bounded
+    max_values: int = 100  # rows returned by one breakdown query
+
+    model_config = {
+        "env_prefix": "ROLLUP_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+rollup_config = RollupConfig()
+
+
+class PartitionConfig(BaseConfig):
+    interval: float = 6 * 60 * 60  # seconds between partition maintenance runs
+    premake_months: int = 3  # monthly VisitLog partitions kept ready ahead of now
+    retention_months: int = 13  # partitions older than this are retired; 0 keeps them forever
+    retention_action: Literal["detach", "drop"] = "detach"
+    default_lookback_days: int = 90  # visit log queries without a range only read this far back
+
+    model_config = {
+        "env_prefix": "PARTITION_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+partition_config = PartitionConfig()
+
+
+class PaginationConfig(BaseConfig):
+    default_limit: int = 100
+    max_limit: int = 1000
+    export_batch_size: int = 5000  # rows fetched per round trip by streaming exports
+
+    model_config = {
+        "env_prefix": "PAGINATION_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+pagination_config = PaginationConfig()
+
+
+class StartupConfig(BaseConfig):
+    check_migrations: bool = True  # production: refuse to boot unless the DB is at the Alembic head
+    db_connections: int = 2  # Postgres connections opened before serving traffic
+    redis_connections: int = 2
+    cache_warm_size: int = 1000  # most-clicked links loaded into the worker's L1
+    hot_list_ttl: int = 600  # seconds the shared most-clicked list is reused by booting workers
+
+    model_config = {
+        "env_prefix": "STARTUP_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+startup_config = StartupConfig()
+
+
+class MetricsConfig(BaseConfig):
+    enabled: bool = True  # /metrics and the per-route latency middleware
+
+    model_config = {
+        "env_prefix": "METRICS_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+metrics_config = MetricsConfig()
+
+
+class TimingConfig(BaseConfig):
+    server_timing: bool = False  # add a Server-Timing header with each request's phases
+    profiler_enabled: bool = False  # GET /ops/profile samples live traffic
+    profiler_max_seconds: float = 60.0
+    profiler_interval: float = 0.005  # seconds between stack samples
+
+    model_config = {
+        "env_prefix": "TIMING_",
+        "env_file": "src/.env",
+        "extra": "ignore"
+    }
+
+timing_config = TimingConfig()
@@ -1,18 +1,112 @@
 # src/core/events.py
+import asyncio
+import logging
+import time
+from pathlib import Path
+
+from alembic.config import Config as AlembicConfig
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
 from sqlmodel import SQLModel
-from services.database import engine, Base
+from services.database import engine, Base, warm_up as warm_up_database
 from apps.shortener import models  # register models
+from core import tasks
+from core.config import (
+    app_config,
+    click_counter_config,
+    code_filter_config,
+    partition_config,
+    rollup_config,
+    startup_config,
+    sweeper_config,
+)
+from services.click_counter import click_counter
+from services.code_filter import code_filter
+from services.expiry_sweeper import expiry_sweeper
+from services.partition_maintenance import partition_maintenance
+from services.redis import close_redis, get_redis, init_redis, warm_up as warm_up_redis
+from services.url_cache import url_cache
+from services.visit_rollup import visit_rollup
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+
 
 async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.create_all)
-    print("✅ Database tables created successfully on startup!")
+    if app_config.environment != "production":
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        return
+    # Production schema is owned by Alembic: no DDL here, only make sure it ran
+    if startup_config.check_migrations:
+        await check_migrations()
+
+
+async def check_migrations():
+    config = AlembicConfig()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    expected = set(ScriptDirectory.from_config(config).get_heads())
+    async with engine.connect() as conn:
+        current = set(await conn.run_sync(
+            lambda sync_conn: MigrationContext.configure(sync_conn).get_current_heads()
+        ))
+    if current != expected:
+        raise RuntimeError(
+            f"Database schema is at {sorted(current) or 'no revision'}, expected "
+            f"{sorted(expected)}; run `alembic upgrade head` before starting the app"
+        )
+
+
+async def warm_up():
+    # Connections and the hottest links ready before the first request. A
+    # failure here only costs the first requests some latency, so boot anyway.
+    try:
+        await asyncio.gather(
+            warm_up_database(startup_config.db_connections),
+            warm_up_redis(startup_config.redis_connections),
+        )
+        redis = await get_redis()
+        loaded = await url_cache.warm(redis, startup_config.cache_warm_size, startup_config.hot_list_ttl)
+        logger.info(f"Warm-up loaded {loaded} links into the redirect cache")
+    except Exception as e:
+        logger.warning(f"Warm-up failed: {e}")
+
+
+def start_redirect_tasks():
+    # What any process serving redirects needs: pending clicks flushed to
+    # Postgres and the in-process caches kept in step with the other workers
+    tasks.start_periodic_task("click-flush", click_counter_config.flush_interval, click_counter.flush_pending)
+    # Long-running subscribers; the interval is only the back-off before a reconnect
+    tasks.start_periodic_task("url-invalidation", 1.0, url_cache.listen_for_invalidations)
+    if code_filter_config.enabled:
+        tasks.start_periodic_task("code-filter", 1.0, code_filter.listen_for_updates)
 
 
 async def startup_event_handler():
+    started = time.perf_counter()
+    init_redis()
     await init_db()
+    await warm_up()
+    tasks.start_periodic_task("visit-partitions", partition_config.interval, partition_maintenance.maintain)
+    tasks.start_periodic_task("expiry-sweep", sweeper_config.interval, expiry_sweeper.sweep)
+    tasks.start_periodic_task("visit-rollup", rollup_config.interval, visit_rollup.roll_up)
+    start_redirect_tasks()
+    logger.info(f"Startup finished in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+
+async def redirect_startup_handler():
+    # core.redirect_app: no DDL and no maintenance jobs, those stay with the API
+    started = time.perf_counter()
+    init_redis()
+    await warm_up()
+    start_redirect_tasks()
+    logger.info(f"Startup finished in {(time.perf_counter() - started) * 1000:.0f}ms")
 
 
 async def shutdown_event_handler():
+    await tasks.stop_background_tasks()
+    await click_counter.flush_pending()  # don't leave this worker's last clicks waiting
+    await close_redis()
     await engine.dispose()
     print("🔴 Application is shutting down.")
@@ -1,25 +1,31 @@
 import logging
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from redis.asyncio import Redis
 from core import events
 from core.router import initialize_routes
-from services.database import engine, get_session
 from middlewares.response_schema import response_schema_middleware
-from core.config import database_config, redis_config
+from core.config import app_config, metrics_config, timing_config
 from fastapi.middleware.cors import CORSMiddleware
-from apps.shortener.apis import shortener_router,campaign_router
-
+from services import metrics
+from services.redis import get_redis
+from services.timing import ServerTimingMiddleware
+from utils.responses import default_response_class
 
-app = FastAPI()
 
-app.add_event_handler("startup", events.startup_event_handler)
-app.add_event_handler("shutdown", events.shutdown_event_handler)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await events.startup_event_handler()
+    yield
+    await events.shutdown_event_handler()
 
-app.include_router(shortener_router)
-app.include_router(campaign_router)
 
-def create_tables():
-    SQLModel.metadata.create_all(engine)
+app = FastAPI(
+    default_response_class=default_response_class(app_config.fast_json),
+    lifespan=lifespan,
+)
 
 
 @app.exception_handler(Exception)
@@ -30,17 +36,6 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"detail": "Internal Server Error", "error": str(exc)},
     )
 
-print("DB CONFIG:")
-print("  username:", database_config.username)
-print("  password:", database_config.password)
-print("  database:", database_config.database)
-print("  host:", database_config.host)
-print("  port:", database_config.port)
-print("REDIS CONFIG:")
-print("  host:", redis_config.host)
-print("  port:", redis_config.port)
-print("  database:", redis_config.database)
-print("  max_connections:", redis_config.max_connections)
 
 app.add_middleware(
     CORSMiddleware,
@@ -56,15 +51,17 @@ def read_root():
 
 response_schema_middleware(app)
 
+if timing_config.server_timing:
+    app.add_middleware(ServerTimingMiddleware)
 
-@app.on_event("startup")
-async def startup() -> None:
-    await events.startup_event_handler()
-
+if metrics_config.enabled:
+    # Outermost, so the latency includes the other middleware
+    app.add_middleware(metrics.MetricsMiddleware)
 
-@app.on_event("shutdown")
-async def shutdown_event() -> None:
-    await events.shutdown_event_handler()
+    # Registered before initialize_routes, where /{short_url} would catch it
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics(redis: Redis = Depends(get_redis)):
+        return Response(await metrics.render(redis), media_type=metrics.CONTENT_TYPE_LATEST)
 
 
 @app.get("/ping")
@@ -0,0 +1,99 @@
+# src/core/redirect_app.py
+# Redirect-only entry point, run on its own workers next to core.main:
+#   gunicorn core.redirect_app:app -k uvicorn.workers.UvicornWorker
+# It serves GET /{short_url} with plain Starlette: no CORS, no response
+# envelope middleware, no dependency injection and no pydantic request models.
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Match, Route
+
+from apps.shortener.controllers import shortener_controller
+from core import events
+from core.config import metrics_config, timing_config
+from services import metrics
+from services.database import unit_of_work
+from services.profiler import sampling_profiler
+from services.redis import get_redis
+from services.timing import ServerTimingMiddleware
+
+
+async def redirect(request: Request):
+    short_url = request.path_params["short_url"].strip().strip('"').strip("'")
+    redis = await get_redis()
+    try:
+        # The session only checks out a connection if the lookup misses Redis
+        async with unit_of_work("/{short_url}") as db:
+            return await shortener_controller.redirect_to_main_url(
+                db=db,
+                redis=redis,
+                short_url=short_url,
+                request=request
+            )
+    except HTTPException as exc:
+        # Same body the API's envelope middleware produces for errors
+        return JSONResponse(
+            {"details": {"detail": exc.detail}, "status_code": exc.status_code},
+            status_code=exc.status_code,
+        )
+
+
+async def health(request: Request):
+    return PlainTextResponse("ok")
+
+
+async def get_metrics(request: Request):
+    return Response(await metrics.render(await get_redis()), media_type=metrics.CONTENT_TYPE_LATEST)
+
+
+async def get_profile(request: Request):
+    # Same as the API's GET /ops/profile, for this app's workers
+    try:
+        seconds = float(request.query_params.get("seconds", 10))
+    except ValueError:
+        seconds = 0
+    if not 0 < seconds <= timing_config.profiler_max_seconds:
+        return PlainTextResponse(
+            f"seconds must be in (0, {timing_config.profiler_max_seconds}]", status_code=400
+        )
+    try:
+        return PlainTextResponse(await sampling_profiler.profile(seconds, timing_config.profiler_interval))
+    except RuntimeError as e:
+        return PlainTextResponse(str(e), status_code=409)
+
+
+class TemplatedRoute(Route):
+    # Puts the matched route in the scope like FastAPI's routes do, so
+    # MetricsMiddleware labels requests with the route's path (the template for
+    # /{short_url}, not the code) instead of "unmatched". Use it for every route.
+
+    def matches(self, scope):
+        match, child_scope = super().matches(scope)
+        if match != Match.NONE:
+            child_scope["route"] = self
+        return match, child_scope
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    await events.redirect_startup_handler()
+    yield
+    await events.shutdown_event_handler()
+
+
+routes = [TemplatedRoute("/healthz", health, methods=["GET"])]
+middleware = []
+if metrics_config.enabled:
+    routes.append(TemplatedRoute("/metrics", get_metrics, methods=["GET"]))
+    middleware.append(Middleware(metrics.MetricsMiddleware))
+if timing_config.server_timing:
+    middleware.append(Middleware(ServerTimingMiddleware))
+if timing_config.profiler_enabled:
+    routes.append(TemplatedRoute("/ops/profile", get_profile, methods=["GET"]))
+routes.append(TemplatedRoute("/{short_url}", redirect, methods=["GET"]))
+
+app = Starlette(routes=routes, middleware=middleware, lifespan=lifespan)
@@ -0,0 +1,33 @@
+# src/core/tasks.py
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+async def _run_periodically(name: str, interval: float, job: Callable[[], Awaitable]):
+    while True:
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Background task {name} failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def start_periodic_task(name: str, interval: float, job: Callable[[], Awaitable]):
+    # One instance per name and worker, even if startup runs more than once
+    if name in _tasks and not _tasks[name].done():
+        return
+    _tasks[name] = asyncio.create_task(_run_periodically(name, interval, job), name=name)
+
+
+async def stop_background_tasks():
+    for task in _tasks.values():
+        task.cancel()
+    await asyncio.gather(*_tasks.values(), return_exceptions=True)
+    _tasks.clear()
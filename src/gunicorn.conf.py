@@ -0,0 +1,21 @@
+# src/gunicorn.conf.py
+# Picked up by gunicorn when it is started from src/ (see docker-compose.yaml).
+# With PROMETHEUS_MULTIPROC_DIR set, workers write their metrics to files in
+# that directory; stale files from an earlier run or a dead worker would keep
+# being added into /metrics, so clear them.
+import os
+import shutil
+
+
+def on_starting(server):
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,79 +1,81 @@
-import json
-from typing import Callable
+from typing import Iterable
 
-from fastapi import Request, FastAPI, status
-from fastapi.responses import JSONResponse, Response
-from fastapi.encoders import jsonable_encoder
-
-from utils.responses import ResponseStructure
+from fastapi import FastAPI, status
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 # Optional: Add paths that shouldn't be wrapped by the middleware
 specific_paths = []
 
+ENVELOPE_PREFIX = b'{"details":'
 
-def response_schema_middleware(app: FastAPI):
-    @app.middleware("http")
-    async def wrap_response(request: Request, call_next: Callable):
-        response = await call_next(request)
 
-        # Skip middleware for FastAPI docs or excluded paths
-        if request.url.path in [
-            app.docs_url,
-            app.openapi_url,
-            app.redoc_url,
-            app.swagger_ui_oauth2_redirect_url,
-            *specific_paths,
-        ]:
-            return response
+class ResponseEnvelopeMiddleware:
+    # Wraps JSON bodies as {"details": <body>, "status_code": <status>} while they
+    # are being sent: the prefix goes out with the first chunk and the suffix with
+    # the last, so the body is never buffered, parsed or serialized a second time
+    # and streaming responses keep streaming.
 
-        # Don't wrap 3xx redirects or error responses
-        if status.HTTP_300_MULTIPLE_CHOICES <= response.status_code < status.HTTP_400_BAD_REQUEST:
-            return response
+    def __init__(self, app: ASGIApp, excluded_paths: Iterable[str] = ()):
+        self.app = app
+        self.excluded_paths = {path for path in excluded_paths if path}
 
-        # Collect response body content (only once!)
-        body_chunks = [chunk async for chunk in response.body_iterator]
-        full_body = b"".join(body_chunks)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
 
-        if not full_body:
-            return Response(
-                content=b"",
-                status_code=response.status_code,
-                headers=dict(response.headers),
-                media_type=response.media_type,
-            )
+        wrap = False
+        started = False
+        suffix = b""
 
-        content_type = response.headers.get("content-type", "")
-        headers = dict(response.headers)
-        headers.pop("content-length", None)
+        async def send_wrapped(message: Message):
+            nonlocal wrap, started, suffix
 
-        # If response is JSON, wrap it in ResponseStructure
-        if content_type.startswith("application/json"):
-            try:
-                json_body = json.loads(full_body.decode())
-                structured_response = ResponseStructure(
-                    details=json_body,
-                    status_code=response.status_code,
-                )
-                return JSONResponse(
-                    content=jsonable_encoder(structured_response),
-                    status_code=response.status_code,
-                    headers=headers,
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                status_code = message["status"]
+                wrap = (
+                    # Don't wrap 3xx redirects
+                    not status.HTTP_300_MULTIPLE_CHOICES <= status_code < status.HTTP_400_BAD_REQUEST
+                    and headers.get("content-type", "").startswith("application/json")
+                    and headers.get("content-length") != "0"
                 )
-            except json.JSONDecodeError:
-                # Not a valid JSON, fallback to original
-                return Response(
-                    content=full_body,
-                    status_code=response.status_code,
-                    headers=headers,
-                    media_type=response.media_type,
-                )
-        else:
-            # For non-JSON (e.g., HTML, plain text, etc.), just return as-is
-            return Response(
-                content=full_body,
-                status_code=response.status_code,
-                headers=headers,
-                media_type=response.media_type,
-            )
+                if wrap:
+                    suffix = b',"status_code":%d}' % status_code
+                    if "content-length" in headers:
+                        headers["content-length"] = str(
+                            int(headers["content-length"]) + len(ENVELOPE_PREFIX) + len(suffix)
+                        )
+                await send(message)
+                return
+
+            if not wrap or message["type"] != "http.response.body":
+                await send(message)
+                return
 
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if body and not started:
+                body = ENVELOPE_PREFIX + body
+                started = True
+            if not more_body and started:
+                body += suffix
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapped)
+
+
+def response_schema_middleware(app: FastAPI):
+    # Skip middleware for FastAPI docs or excluded paths
+    app.add_middleware(
+        ResponseEnvelopeMiddleware,
+        excluded_paths=[
+            app.docs_url,
+            app.openapi_url,
+            app.redoc_url,
+            app.swagger_ui_oauth2_redirect_url,
+            *specific_paths,
+        ],
+    )
     return app
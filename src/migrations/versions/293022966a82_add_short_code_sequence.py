@@ -0,0 +1,28 @@
+"""add short_code_seq
+
+Revision ID: 293022966a82
+Revises: 310fb07545fb
+Create Date: 2026-10-18 20:31:05.112846
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '293022966a82'
+down_revision: Union[str, None] = '310fb07545fb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence('short_code_seq')))
+
+
+def downgrade() -> None:
+    op.execute(sa.schema.DropSequence(sa.Sequence('short_code_seq')))
@@ -0,0 +1,43 @@
+"""add visit rollup tables
+
+Revision ID: 5b2e9c4d7a13
+Revises: 8c1d0e5f7a24
+Create Date: 2026-10-19 09:14:36.402871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2e9c4d7a13'
+down_revision: Union[str, None] = '8c1d0e5f7a24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('visitrollup',
+    sa.Column('short_url', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('granularity', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('dimension', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('value', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('clicks', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('short_url', 'granularity', 'dimension', 'bucket', 'value')
+    )
+    op.create_table('rollupwatermark',
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('last_id', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rollupwatermark')
+    op.drop_table('visitrollup')
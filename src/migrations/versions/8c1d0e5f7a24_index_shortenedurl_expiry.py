@@ -0,0 +1,33 @@
+"""index shortenedurl expiry for the sweeper
+
+Revision ID: 8c1d0e5f7a24
+Revises: 293022966a82
+Create Date: 2026-10-18 21:02:47.530118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c1d0e5f7a24'
+down_revision: Union[str, None] = '293022966a82'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_shortenedurl_expires_at'), 'shortenedurl', ['expires_at'], unique=False)
+    op.create_index(
+        'ix_shortenedurl_expired_updated_at', 'shortenedurl', ['updated_at'],
+        unique=False, postgresql_where=sa.text('expired'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_shortenedurl_expired_updated_at', table_name='shortenedurl')
+    op.drop_index(op.f('ix_shortenedurl_expires_at'), table_name='shortenedurl')
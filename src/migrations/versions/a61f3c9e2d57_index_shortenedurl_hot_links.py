@@ -0,0 +1,37 @@
+"""index live shortenedurl rows by click_count for the cache warm-up
+
+Revision ID: a61f3c9e2d57
+Revises: e4a9d2c6f158
+Create Date: 2026-10-18 23:41:09.218364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a61f3c9e2d57'
+down_revision: Union[str, None] = 'e4a9d2c6f158'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY so a large shortenedurl keeps taking writes while it builds
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_shortenedurl_live_click_count', 'shortenedurl', ['click_count'],
+            unique=False, postgresql_where=sa.text('active AND NOT expired'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_shortenedurl_live_click_count', table_name='shortenedurl', postgresql_concurrently=True
+        )
@@ -0,0 +1,108 @@
+"""partition visitlog by month on visited_at
+
+Revision ID: c3f7a1e8b904
+Revises: 5b2e9c4d7a13
+Create Date: 2026-10-19 11:42:08.915364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f7a1e8b904'
+down_revision: Union[str, None] = '5b2e9c4d7a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Keep in step with PartitionConfig.premake_months
+PREMAKE_MONTHS = 3
+
+COLUMNS = """
+    short_url VARCHAR NOT NULL,
+    client_ip VARCHAR NOT NULL,
+    system_id VARCHAR,
+    city VARCHAR,
+    country VARCHAR,
+    latitude FLOAT,
+    longitude FLOAT,
+    device VARCHAR,
+    os VARCHAR,
+    browser VARCHAR,
+    visited_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+"""
+COLUMN_NAMES = (
+    "id, short_url, client_ip, system_id, city, country, latitude, longitude, "
+    "device, os, browser, visited_at, created_at"
+)
+
+
+def upgrade() -> None:
+    # visitlog was only ever created by create_all at startup, so it may not exist yet
+    has_visitlog = sa.inspect(op.get_bind()).has_table('visitlog')
+    if has_visitlog:
+        op.execute('ALTER TABLE visitlog RENAME TO visitlog_unpartitioned')
+        op.execute('ALTER TABLE visitlog_unpartitioned RENAME CONSTRAINT visitlog_pkey TO visitlog_unpartitioned_pkey')
+        # Keep handing out ids from the same sequence: the rollup watermark relies on them growing
+        op.execute('ALTER SEQUENCE visitlog_id_seq AS BIGINT')
+    else:
+        op.execute('CREATE SEQUENCE visitlog_id_seq AS BIGINT')
+
+    op.execute(f"""
+        CREATE TABLE visitlog (
+            id BIGINT NOT NULL DEFAULT nextval('visitlog_id_seq'),
+            {COLUMNS},
+            PRIMARY KEY (id, visited_at)
+        ) PARTITION BY RANGE (visited_at)
+    """)
+    op.execute('ALTER SEQUENCE visitlog_id_seq OWNED BY visitlog.id')
+    op.execute('CREATE TABLE visitlog_default PARTITION OF visitlog DEFAULT')
+
+    # One partition per month from the oldest visit up to PREMAKE_MONTHS ahead
+    oldest = (
+        "(SELECT min(visited_at) FROM visitlog_unpartitioned)" if has_visitlog else "NULL"
+    )
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month DATE := date_trunc('month', coalesce({oldest}, now()));
+        BEGIN
+            WHILE month <= date_trunc('month', now()) + interval '{PREMAKE_MONTHS} months' LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF visitlog FOR VALUES FROM (%L) TO (%L)',
+                    'visitlog_y' || to_char(month, 'YYYY') || 'm' || to_char(month, 'MM'),
+                    month,
+                    month + interval '1 month'
+                );
+                month := month + interval '1 month';
+            END LOOP;
+        END $$
+    """)
+
+    if has_visitlog:
+        op.execute(
+            f'INSERT INTO visitlog ({COLUMN_NAMES}) '
+            f'SELECT {COLUMN_NAMES} FROM visitlog_unpartitioned'
+        )
+        op.execute('DROP TABLE visitlog_unpartitioned')
+
+
+def downgrade() -> None:
+    op.execute('ALTER TABLE visitlog RENAME TO visitlog_partitioned')
+    op.execute('ALTER SEQUENCE visitlog_id_seq OWNED BY NONE')
+    op.execute(f"""
+        CREATE TABLE visitlog (
+            id BIGINT NOT NULL DEFAULT nextval('visitlog_id_seq'),
+            {COLUMNS},
+            CONSTRAINT visitlog_unpartitioned_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute(f'INSERT INTO visitlog ({COLUMN_NAMES}) SELECT {COLUMN_NAMES} FROM visitlog_partitioned')
+    op.execute('DROP TABLE visitlog_partitioned')
+    op.execute('ALTER TABLE visitlog RENAME CONSTRAINT visitlog_unpartitioned_pkey TO visitlog_pkey')
+    op.execute('ALTER SEQUENCE visitlog_id_seq OWNED BY visitlog.id')
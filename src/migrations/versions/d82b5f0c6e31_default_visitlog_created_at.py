@@ -0,0 +1,29 @@
+"""set visitlog.created_at at insert time in the database
+
+Revision ID: d82b5f0c6e31
+Revises: a61f3c9e2d57
+Create Date: 2026-10-19 00:12:40.573921
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd82b5f0c6e31'
+down_revision: Union[str, None] = 'a61f3c9e2d57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The visit rollup's lag is measured from this, so it has to be the insert time
+    op.alter_column('visitlog', 'created_at', server_default=sa.text("timezone('utc', now())"))
+
+
+def downgrade() -> None:
+    op.alter_column('visitlog', 'created_at', server_default=None)
@@ -0,0 +1,33 @@
+"""index visitlog by client_ip and short_url with visited_at
+
+Revision ID: e4a9d2c6f158
+Revises: c3f7a1e8b904
+Create Date: 2026-10-19 14:05:51.273604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a9d2c6f158'
+down_revision: Union[str, None] = 'c3f7a1e8b904'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Created on the partitioned parent, so Postgres builds one per partition and
+    # adds them to every partition created later. CONCURRENTLY isn't available
+    # on a partitioned table; build per partition by hand if the lock is a problem.
+    op.create_index('ix_visitlog_client_ip_visited_at', 'visitlog', ['client_ip', 'visited_at'], unique=False)
+    op.create_index('ix_visitlog_short_url_visited_at', 'visitlog', ['short_url', 'visited_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_visitlog_short_url_visited_at', table_name='visitlog')
+    op.drop_index('ix_visitlog_client_ip_visited_at', table_name='visitlog')
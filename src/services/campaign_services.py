@@ -5,9 +5,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import delete, update
 from fastapi import HTTPException
+from typing import Optional
 
 from apps.shortener.models import CampaignSource, CampaignMedium, CampaignName
 from apps.shortener.schemas import CampaignMediumUpdate, CampaignNameUpdate, CampaignSourceUpdate
+from core.config import pagination_config
+from utils.pagination import decode_cursor, encode_cursor, split_page
 
 
 # ======================
@@ -17,6 +20,24 @@ from apps.shortener.schemas import CampaignMediumUpdate, CampaignNameUpdate, Cam
 def generate_unique_id(length=6):
     return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
 
+
+async def list_by_user(db: AsyncSession, model, user_id: str, cursor: Optional[str], limit: Optional[int]):
+    # Keyset pagination on id; returns the page and the cursor for the next one.
+    # Without a cursor or limit every row is returned, as before pagination.
+    statement = select(model).where(model.user_id == user_id).order_by(model.id)
+    if cursor is None and limit is None:
+        result = await db.execute(statement)
+        return result.scalars().all(), None
+    limit = limit or pagination_config.default_limit
+    statement = statement.limit(limit + 1)
+    after = decode_cursor(cursor, int)
+    if after:
+        statement = statement.where(model.id > after[0])
+    result = await db.execute(statement)
+    items, has_more = split_page(result.scalars().all(), limit)
+    return items, encode_cursor(items[-1].id) if has_more else None
+
+
 async def create_campaign_source(db: AsyncSession, user_id, campaign_source_tag, campaign_source_name):
     unique_id = generate_unique_id()
     new_source = CampaignSource(
@@ -30,9 +51,8 @@ async def create_campaign_source(db: AsyncSession, user_id, campaign_source_tag,
     await db.refresh(new_source)
     return {"user_id": user_id, "unique_id": unique_id,"campaign_source_tag":campaign_source_tag,"campaign_source_name":campaign_source_name}
 
-async def get_campaign_sources_by_user(db: AsyncSession, user_id):
-    result = await db.execute(select(CampaignSource).where(CampaignSource.user_id == user_id))
-    return result.scalars().all()
+async def get_campaign_sources_by_user(db: AsyncSession, user_id, cursor: Optional[str] = None, limit: Optional[int] = None):
+    return await list_by_user(db, CampaignSource, user_id, cursor, limit)
 
 async def update_campaign_source(
     db: AsyncSession,
@@ -103,9 +123,8 @@ async def create_campaign_medium(db: AsyncSession, user_id: str, medium_tag: str
     await db.refresh(new_medium)
     return {"user_id": user_id, "unique_id": unique_id,"campaign_medium_tag":medium_tag,"campaign_medium_name":medium_name}
 
-async def get_campaign_mediums_by_user(db: AsyncSession, user_id):
-    result = await db.execute(select(CampaignMedium).where(CampaignMedium.user_id == user_id))
-    return result.scalars().all()
+async def get_campaign_mediums_by_user(db: AsyncSession, user_id, cursor: Optional[str] = None, limit: Optional[int] = None):
+    return await list_by_user(db, CampaignMedium, user_id, cursor, limit)
 
 async def update_campaign_medium(
     db: AsyncSession,
@@ -175,11 +194,8 @@ async def create_campaign_name(db: AsyncSession, user_id: str, name_tag: str, na
     await db.refresh(new_name)
     return {"user_id": user_id, "unique_id": unique_id,"campaign_name_tag":name_tag,"campaign_name":name}
 
-async def get_campaign_names_by_user(db: AsyncSession, user_id: str):
-    result = await db.execute(
-        select(CampaignName).where(CampaignName.user_id == user_id)
-    )
-    return result.scalars().all()
+async def get_campaign_names_by_user(db: AsyncSession, user_id: str, cursor: Optional[str] = None, limit: Optional[int] = None):
+    return await list_by_user(db, CampaignName, user_id, cursor, limit)
 
 
 async def update_campaign_name(
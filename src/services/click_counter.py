@@ -0,0 +1,171 @@
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from redis.asyncio import Redis
+from sqlalchemy import Integer, String, column, update, values
+
+from apps.shortener.models import ShortenedUrl
+from core.config import click_counter_config
+from services.database import async_session
+from services.redis import get_redis
+
+
+class ClickCounterService:
+    # clicks:count:<code> holds the running total used for max_clicks checks,
+    # clicks:pending the deltas not yet written to ShortenedUrl.click_count.
+    # Clicks are spent by services.redirect_lookup's script; this seeds the
+    # totals and writes the pending deltas back to Postgres.
+
+    COUNT_PREFIX = "clicks:count:"
+    PENDING_KEY = "clicks:pending"
+    FLUSHING_PREFIX = "clicks:flushing:"
+    FLUSHING_INDEX_KEY = "clicks:flushing"  # zset of clicks:flushing:* keys by start time
+    EXHAUSTED_KEY = "clicks:exhausted"  # codes whose rows still need expired=True
+
+    # KEYS: source, destination, flushing index  ARGV: now
+    # Renames a pending/flushing hash and records the new name in the index in
+    # one step, so a worker dying right after the rename can't lose track of it
+    CLAIM_SCRIPT = """
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        redis.call('ZREM', KEYS[3], KEYS[1])
+        return 0
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+    redis.call('ZREM', KEYS[3], KEYS[1])
+    redis.call('ZADD', KEYS[3], ARGV[1], KEYS[2])
+    return 1
+    """
+
+    # KEYS: count, pending, flushing index  ARGV: short_url, click_count, ttl, overwrite ("1")
+    # Postgres lags Redis by whatever is still pending or being flushed, so the
+    # seed adds the code's field from clicks:pending and every in-flight
+    # clicks:flushing:* hash back in
+    SEED_SCRIPT = """
+    local total = tonumber(ARGV[2]) + tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or 0)
+    for _, key in ipairs(redis.call('ZRANGE', KEYS[3], 0, -1)) do
+        total = total + tonumber(redis.call('HGET', key, ARGV[1]) or 0)
+    end
+    if ARGV[4] == '1' then
+        redis.call('SET', KEYS[1], total, 'EX', ARGV[3])
+    else
+        redis.call('SET', KEYS[1], total, 'EX', ARGV[3], 'NX')
+    end
+    return total
+    """
+
+    def __init__(self):
+        self._claim_script = None
+        self._seed_script = None
+
+    def count_key(self, short_url: str) -> str:
+        return f"{self.COUNT_PREFIX}{short_url}"
+
+    async def seed(self, redis: Redis, short_url: str, click_count: int, ttl: int, overwrite: bool = False):
+        if self._seed_script is None:
+            self._seed_script = redis.register_script(self.SEED_SCRIPT)
+        await self._seed_script(
+            keys=[self.count_key(short_url), self.PENDING_KEY, self.FLUSHING_INDEX_KEY],
+            args=[short_url, click_count, ttl, "1" if overwrite else "0"],
+            client=redis,
+        )
+
+    async def seed_many(self, redis: Redis, ttls: Dict[str, int]):
+        # Newly created codes: nothing can be pending yet, so they all start at zero
+        async with redis.pipeline(transaction=False) as pipe:
+            for short_url, ttl in ttls.items():
+                pipe.set(self.count_key(short_url), 0, ex=ttl)
+            await pipe.execute()
+
+    async def discard(self, redis: Redis, *short_urls: str):
+        await redis.delete(*[self.count_key(short_url) for short_url in short_urls])
+
+    async def flush_pending(self) -> int:
+        redis = await get_redis()
+        flushed = await self._reclaim_orphans(redis)
+
+        flushing_key = await self._claim(redis, self.PENDING_KEY)
+        if flushing_key:  # None when nothing was pending since the last flush
+            flushed += await self._flush_key(redis, flushing_key)
+
+        await self._expire_exhausted(redis)
+        return flushed
+
+    async def _claim(self, redis: Redis, key: str) -> Optional[str]:
+        if self._claim_script is None:
+            self._claim_script = redis.register_script(self.CLAIM_SCRIPT)
+        now = time.time()
+        flushing_key = f"{self.FLUSHING_PREFIX}{int(now)}:{uuid.uuid4().hex}"
+        claimed = await self._claim_script(
+            keys=[key, flushing_key, self.FLUSHING_INDEX_KEY], args=[now], client=redis
+        )
+        return flushing_key if int(claimed) else None
+
+    async def _expire_exhausted(self, redis: Redis):
+        batch_size = click_counter_config.flush_batch_size
+        while True:
+            short_urls = await redis.srandmember(self.EXHAUSTED_KEY, batch_size)
+            if not short_urls:
+                return
+            async with async_session() as db:
+                await db.execute(
+                    update(ShortenedUrl)
+                    .where(ShortenedUrl.short_url.in_(short_urls))
+                    .values(expired=True, active=False, updated_at=datetime.utcnow())
+                )
+                await db.commit()
+            await redis.srem(self.EXHAUSTED_KEY, *short_urls)
+            if len(short_urls) < batch_size:
+                return
+
+    async def _reclaim_orphans(self, redis: Redis) -> int:
+        # A worker that died mid-flush leaves its clicks:flushing:* hash behind;
+        # the index finds those without scanning the keyspace
+        flushed = 0
+        cutoff = time.time() - click_counter_config.orphan_after
+        for key in await redis.zrangebyscore(self.FLUSHING_INDEX_KEY, "-inf", cutoff):
+            claimed_key = await self._claim(redis, key)
+            if claimed_key is None:
+                continue  # another worker claimed it first, or it was already flushed
+            flushed += await self._flush_key(redis, claimed_key)
+        return flushed
+
+    async def _flush_key(self, redis: Redis, flushing_key: str) -> int:
+        counts = await redis.hgetall(flushing_key)
+        deltas: List[Tuple[str, int]] = [
+            (short_url, int(clicks)) for short_url, clicks in counts.items() if int(clicks)
+        ]
+
+        batch_size = click_counter_config.flush_batch_size
+        for start in range(0, len(deltas), batch_size):
+            batch = deltas[start:start + batch_size]
+            await self._apply(batch)
+            # At most one batch is counted twice if we die between commit and HDEL
+            await redis.hdel(flushing_key, *[short_url for short_url, _ in batch])
+
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.delete(flushing_key)
+            pipe.zrem(self.FLUSHING_INDEX_KEY, flushing_key)
+            await pipe.execute()
+        return sum(clicks for _, clicks in deltas)
+
+    @staticmethod
+    async def _apply(batch: List[Tuple[str, int]]):
+        deltas = values(
+            column("short_url", String), column("clicks", Integer), name="deltas"
+        ).data(batch)
+        statement = (
+            update(ShortenedUrl)
+            .where(ShortenedUrl.short_url == deltas.c.short_url)
+            .values(
+                click_count=ShortenedUrl.click_count + deltas.c.clicks,
+                updated_at=datetime.utcnow(),
+            )
+        )
+        async with async_session() as db:
+            await db.execute(statement)
+            await db.commit()
+
+
+click_counter = ClickCounterService()
@@ -0,0 +1,204 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from sqlalchemy import func, literal_column, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from apps.shortener.models import VisitLog
+from core.config import click_stats_config
+
+GRANULARITIES = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+
+class ClickStatsService:
+    # One Redis hash per short_url holds the running total plus per-day buckets
+    # (UTC). Hour buckets live in one hash per link and day that expires
+    # hour_retention_days after the day ends, so they don't pile up for the
+    # link's lifetime; older hours are counted from VisitLog. The visit ingest
+    # worker bumps both in the same transaction that acks the events, so they
+    # count exactly what was stored. Links that predate the counters are seeded
+    # once from VisitLog.
+
+    KEY_PREFIX = "stats:"
+    SEEDED_FIELD = "seeded"
+    TOTAL_FIELD = "total"
+
+    def key(self, short_url: str) -> str:
+        return f"{self.KEY_PREFIX}{short_url}"
+
+    def hour_key(self, short_url: str, moment: datetime) -> str:
+        return f"{self.KEY_PREFIX}{short_url}:h:{moment:%Y-%m-%d}"
+
+    @staticmethod
+    def hour_key_expires_at(moment: datetime) -> datetime:
+        day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        return day + timedelta(days=1 + click_stats_config.hour_retention_days)
+
+    @staticmethod
+    def hour_cutoff(now: datetime) -> datetime:
+        # Hours from here on are still in Redis (their day's hash outlives this)
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return today - timedelta(days=click_stats_config.hour_retention_days)
+
+    def retained_hour_keys(self, short_url: str, now: datetime) -> List[str]:
+        cutoff = self.hour_cutoff(now)
+        return [
+            self.hour_key(short_url, cutoff + timedelta(days=offset))
+            for offset in range(click_stats_config.hour_retention_days + 1)
+        ]
+
+    @staticmethod
+    def bucket_start(moment: datetime, granularity: str) -> datetime:
+        if granularity == "day":
+            return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        return moment.replace(minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def field(moment: datetime, granularity: str) -> str:
+        if granularity == "day":
+            return moment.strftime("d:%Y-%m-%d")
+        return moment.strftime("%H")
+
+    def _queue_hours(self, pipe: Pipeline, short_url: str, hours: Dict[datetime, int]):
+        expiries: Dict[str, datetime] = {}
+        for hour, count in hours.items():
+            key = self.hour_key(short_url, hour)
+            pipe.hincrby(key, self.field(hour, "hour"), count)
+            expiries[key] = self.hour_key_expires_at(hour)
+        for key, expires_at in expiries.items():
+            # A key past its retention is simply deleted again
+            pipe.expireat(key, expires_at)
+
+    def record(self, pipe: Pipeline, rows: Iterable[dict]):
+        # Queue the increments for a batch of stored VisitLog rows on the caller's pipeline
+        totals: Counter = Counter()
+        days: Counter = Counter()
+        hours: Dict[str, Counter] = {}
+        for row in rows:
+            short_url, visited_at = row["short_url"], row["visited_at"]
+            totals[short_url] += 1
+            days[short_url, self.field(visited_at, "day")] += 1
+            hours.setdefault(short_url, Counter())[self.bucket_start(visited_at, "hour")] += 1
+        for short_url, count in totals.items():
+            pipe.hincrby(self.key(short_url), self.TOTAL_FIELD, count)
+        for (short_url, field), count in days.items():
+            pipe.hincrby(self.key(short_url), field, count)
+        for short_url, counts in hours.items():
+            self._queue_hours(pipe, short_url, counts)
+
+    async def start(self, redis: Redis, short_urls: List[str]):
+        # New links have no visits yet, so there is nothing to seed from VisitLog.
+        # A reclaimed code may still have its previous link's hour buckets.
+        now = datetime.utcnow()
+        async with redis.pipeline(transaction=False) as pipe:
+            for short_url in short_urls:
+                pipe.delete(self.key(short_url), *self.retained_hour_keys(short_url, now))
+                pipe.hset(self.key(short_url), mapping={self.SEEDED_FIELD: 1, self.TOTAL_FIELD: 0})
+            await pipe.execute()
+
+    async def discard(self, redis: Redis, *short_urls: str):
+        now = datetime.utcnow()
+        keys = []
+        for short_url in short_urls:
+            keys += [self.key(short_url), *self.retained_hour_keys(short_url, now)]
+        await redis.delete(*keys)
+
+    @staticmethod
+    async def _hourly_counts(
+        db: AsyncSession, short_url: str, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> Dict[datetime, int]:
+        # The unit is inlined because a bound parameter would differ between SELECT and GROUP BY
+        hour = func.date_trunc(literal_column("'hour'"), VisitLog.visited_at).label("hour")
+        statement = select(hour, func.count()).where(VisitLog.short_url == short_url)
+        if since is not None:
+            statement = statement.where(VisitLog.visited_at >= since)
+        if until is not None:
+            statement = statement.where(VisitLog.visited_at < until)
+        result = await db.execute(statement.group_by(hour))
+        return dict(result.all())
+
+    async def _seed(self, db: AsyncSession, redis: Redis, short_url: str) -> bool:
+        # Visits ingested while this runs may be counted once too often or not at
+        # all; the window is one query long and only ever hit once per link.
+        now = datetime.utcnow()
+        cutoff = self.hour_cutoff(now)
+        mapping: Dict[str, int] = Counter()
+        hours: Dict[datetime, int] = {}
+        for bucket, count in (await self._hourly_counts(db, short_url)).items():
+            mapping[self.field(bucket, "day")] += count
+            mapping[self.TOTAL_FIELD] += count
+            if bucket >= cutoff:
+                hours[bucket] = count
+        if not mapping:
+            # Nothing to count (or no such link); don't leave a key behind
+            return False
+
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self.key(short_url), *self.retained_hour_keys(short_url, now))
+            pipe.hset(self.key(short_url), mapping={**mapping, self.SEEDED_FIELD: 1})
+            self._queue_hours(pipe, short_url, hours)
+            await pipe.execute()
+        return True
+
+    async def total(self, db: AsyncSession, redis: Redis, short_url: str) -> int:
+        seeded, total = await redis.hmget(self.key(short_url), [self.SEEDED_FIELD, self.TOTAL_FIELD])
+        if seeded is None:
+            await self._seed(db, redis, short_url)
+            total = await redis.hget(self.key(short_url), self.TOTAL_FIELD)
+        return int(total or 0)
+
+    async def _hour_counts(
+        self, db: AsyncSession, redis: Redis, short_url: str, buckets: List[datetime]
+    ) -> List[int]:
+        cutoff = self.hour_cutoff(datetime.utcnow())
+        counts: Dict[datetime, int] = {}
+        older = [bucket for bucket in buckets if bucket < cutoff]
+        if older:
+            counts.update(await self._hourly_counts(db, short_url, older[0], older[-1] + GRANULARITIES["hour"]))
+
+        recent = [bucket for bucket in buckets if bucket >= cutoff]
+        if recent:
+            async with redis.pipeline(transaction=False) as pipe:
+                for bucket in recent:
+                    pipe.hget(self.hour_key(short_url, bucket), self.field(bucket, "hour"))
+                for bucket, count in zip(recent, await pipe.execute()):
+                    counts[bucket] = int(count or 0)
+        return [counts.get(bucket, 0) for bucket in buckets]
+
+    async def series(
+        self,
+        db: AsyncSession,
+        redis: Redis,
+        short_url: str,
+        granularity: str,
+        start: datetime,
+        end: datetime,
+    ) -> List[dict]:
+        step = GRANULARITIES[granularity]
+        buckets = []
+        bucket = self.bucket_start(start, granularity)
+        while bucket <= end and len(buckets) < click_stats_config.max_points:
+            buckets.append(bucket)
+            bucket += step
+
+        if not await redis.hexists(self.key(short_url), self.SEEDED_FIELD):
+            await self._seed(db, redis, short_url)
+        if not buckets:
+            counts: List[Optional[str]] = []
+        elif granularity == "hour":
+            counts = await self._hour_counts(db, redis, short_url, buckets)
+        else:
+            counts = await redis.hmget(self.key(short_url), [self.field(bucket, granularity) for bucket in buckets])
+        return [
+            {"bucket": bucket.isoformat(), "clicks": int(count or 0)}
+            for bucket, count in zip(buckets, counts)
+        ]
+
+
+click_stats = ClickStatsService()
@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import string
+from abc import ABC, abstractmethod
+from typing import Dict, List, Type
+
+from sqlalchemy import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from apps.shortener.models import ShortenedUrl, short_code_seq
+from core.config import app_config, short_code_config
+from utils.random_utils import generate_random_characters
+
+BASE62 = string.digits + string.ascii_letters
+
+
+class CodeAllocator(ABC):
+
+    @abstractmethod
+    async def allocate_many(self, db: AsyncSession, domain: str, count: int) -> List[str]:
+        ...
+
+    async def allocate(self, db: AsyncSession, domain: str) -> str:
+        return (await self.allocate_many(db, domain, 1))[0]
+
+
+class RandomCodeAllocator(CodeAllocator):
+    # The original scheme: random 5-character codes, checked against the table until unused
+
+    async def allocate_many(self, db: AsyncSession, domain: str, count: int) -> List[str]:
+        codes: List[str] = []
+        while len(codes) < count:
+            candidates = {
+                generate_random_characters(length=short_code_config.min_length)
+                for _ in range(count - len(codes))
+            } - set(codes)
+            result = await db.execute(
+                select(ShortenedUrl.short_url).where(
+                    ShortenedUrl.short_url.in_(candidates),
+                    ShortenedUrl.custom_domain == domain
+                )
+            )
+            codes.extend(candidates - set(result.scalars().all()))
+        return codes
+
+
+class SequenceCodeAllocator(CodeAllocator):
+    # Unique ids come from a Postgres sequence, reserved a block at a time per worker.
+    # Each id is mapped to a base62 code through a keyed Feistel permutation, so codes
+    # are unique by construction yet don't look sequential. Ids beyond the 62**n
+    # codes of one length continue into the next length.
+
+    def __init__(self):
+        self._block: List[int] = []
+        self._lock = asyncio.Lock()
+        key = short_code_config.key or app_config.secret_key
+        self._key = hashlib.blake2b(key.encode(), digest_size=32).digest()
+
+    async def _reserve(self, db: AsyncSession, count: int) -> List[int]:
+        async with self._lock:
+            if len(self._block) < count:
+                size = max(count - len(self._block), short_code_config.block_size)
+                result = await db.execute(
+                    select(short_code_seq.next_value()).select_from(func.generate_series(1, size))
+                )
+                self._block.extend(result.scalars().all())
+            ids, self._block = self._block[:count], self._block[count:]
+            return ids
+
+    def _round(self, length: int, round_index: int, value: int, mask: int) -> int:
+        digest = hashlib.blake2b(
+            value.to_bytes(8, "big"),
+            key=self._key,
+            digest_size=8,
+            person=bytes([length, round_index]),
+        ).digest()
+        return int.from_bytes(digest, "big") & mask
+
+    def _permute(self, value: int, length: int) -> int:
+        domain = len(BASE62) ** length
+        bits = domain.bit_length()
+        half = (bits + 1) // 2
+        mask = (1 << half) - 1
+        # Cycle-walk: a balanced Feistel network permutes [0, 2**(2*half)); repeat until in range
+        while True:
+            left, right = value >> half, value & mask
+            for round_index in range(short_code_config.feistel_rounds):
+                left, right = right, left ^ self._round(length, round_index, right, mask)
+            value = (left << half) | right
+            if value < domain:
+                return value
+
+    def encode(self, sequence_id: int) -> str:
+        length = short_code_config.min_length
+        while sequence_id >= len(BASE62) ** length:
+            sequence_id -= len(BASE62) ** length
+            length += 1
+
+        value = self._permute(sequence_id, length)
+        chars = []
+        for _ in range(length):
+            value, digit = divmod(value, len(BASE62))
+            chars.append(BASE62[digit])
+        return "".join(reversed(chars))
+
+    async def allocate_many(self, db: AsyncSession, domain: str, count: int) -> List[str]:
+        return [self.encode(sequence_id) for sequence_id in await self._reserve(db, count)]
+
+
+ALLOCATORS: Dict[str, Type[CodeAllocator]] = {
+    "random": RandomCodeAllocator,
+    "sequence": SequenceCodeAllocator,
+}
+
+code_allocator: CodeAllocator = ALLOCATORS[short_code_config.allocator]()
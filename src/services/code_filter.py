@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from redis.asyncio import Redis
+from redis.client import NEVER_DECODE
+from sqlmodel import select
+
+from apps.shortener.models import ShortenedUrl
+from core.config import code_filter_config
+from services.database import async_session
+from services.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class ShortCodeFilter:
+    # Bloom filter of every issued short code. The bitmap lives in Redis and each
+    # worker keeps a copy in memory, so a definitely-unknown code that isn't in
+    # Redis either is rejected without touching Postgres. Codes that pass the
+    # filter but have no row get a short negative-cache entry instead. The filter
+    # only ever fails open: until it is loaded every code is treated as possibly
+    # known.
+
+    BITS_KEY = "shortcodes:bloom"
+    META_KEY = "shortcodes:bloom:meta"
+    LOCK_KEY = "shortcodes:bloom:lock"
+    EVENTS_CHANNEL = "shortcodes:events"
+    NEGATIVE_PREFIX = "url:missing:"
+    EXPIRED_MARKER = "expired"  # negative-cache value for links that existed but expired
+    THREAD_BATCH = 1000  # adds of this many codes are hashed off the event loop
+    SETBIT_BATCH = 10_000  # bit positions per SETBIT_SCRIPT call
+    MAX_ADD_ATTEMPTS = 3
+
+    # SETBIT_SCRIPT statuses
+    SET = 1
+    NO_FILTER = 0  # nothing built yet; the rebuild reads every code from Postgres
+    STALE = -1  # rebuilt with another size since this worker loaded it
+
+    # KEYS: bits, meta  ARGV: size_bits, hash_count, positions...
+    # Positions depend on the bitmap's size, so they are only set if they were
+    # computed for the geometry that is current in Redis
+    SETBIT_SCRIPT = """
+    local meta = redis.call('HMGET', KEYS[2], 'size_bits', 'hash_count')
+    if not meta[1] then
+        return 0
+    end
+    if meta[1] ~= ARGV[1] or meta[2] ~= ARGV[2] then
+        return -1
+    end
+    for i = 3, #ARGV do
+        redis.call('SETBIT', KEYS[1], ARGV[i], 1)
+    end
+    return 1
+    """
+
+    def __init__(self):
+        self._bits: Optional[bytearray] = None
+        self._lock = asyncio.Lock()  # serialises changes to this worker's copy
+        self._setbit_script = None
+        self.size_bits = 0
+        self.hash_count = 0
+        self.rejected = 0
+        self.negative_hits = 0
+
+    @staticmethod
+    def sizing(item_count: int):
+        items = max(item_count, 1)
+        size_bits = math.ceil(-items * math.log(code_filter_config.false_positive_rate) / math.log(2) ** 2)
+        size_bits = (size_bits + 7) // 8 * 8
+        hash_count = max(1, round(size_bits / items * math.log(2)))
+        return size_bits, hash_count
+
+    def _positions(self, short_url: str, size_bits: int, hash_count: int) -> List[int]:
+        # Kirsch-Mitzenmacher double hashing over one 128-bit digest
+        digest = hashlib.blake2b(short_url.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % size_bits for i in range(hash_count)]
+
+    def _positions_for(self, short_urls: Iterable[str], size_bits: int, hash_count: int) -> List[int]:
+        return [
+            position
+            for short_url in short_urls
+            for position in self._positions(short_url, size_bits, hash_count)
+        ]
+
+    @staticmethod
+    def _set_bits(bits: bytearray, positions: Iterable[int]) -> bytearray:
+        # Same bit order as Redis SETBIT: offset 0 is the most significant bit of byte 0
+        for position in positions:
+            bits[position >> 3] |= 0x80 >> (position & 7)
+        return bits
+
+    def might_contain(self, short_url: str) -> bool:
+        bits = self._bits
+        if bits is None or not code_filter_config.enabled:
+            return True
+        for position in self._positions(short_url, self.size_bits, self.hash_count):
+            if not bits[position >> 3] & (0x80 >> (position & 7)):
+                self.rejected += 1
+                return False
+        return True
+
+    async def _add_local(self, short_urls: List[str]) -> Tuple[int, int, List[int]]:
+        """Sets the codes' bits in this worker's copy; returns its geometry and the positions."""
+        async with self._lock:
+            bits, size_bits, hash_count = self._bits, self.size_bits, self.hash_count
+            if bits is None:
+                return 0, 0, []
+            if len(short_urls) < self.THREAD_BATCH:
+                positions = self._positions_for(short_urls, size_bits, hash_count)
+                self._set_bits(bits, positions)
+                return size_bits, hash_count, positions
+
+            # A big batch is hashed into a copy in a thread and swapped in, so
+            # redirects keep being served meanwhile
+            def build():
+                positions = self._positions_for(short_urls, size_bits, hash_count)
+                return self._set_bits(bytearray(bits), positions), positions
+
+            self._bits, positions = await asyncio.to_thread(build)
+            return size_bits, hash_count, positions
+
+    async def _set_shared_bits(self, redis: Redis, size_bits: int, hash_count: int, positions: List[int]) -> int:
+        if self._setbit_script is None:
+            self._setbit_script = redis.register_script(self.SETBIT_SCRIPT)
+        status = self.NO_FILTER
+        for start in range(0, len(positions), self.SETBIT_BATCH):
+            status = int(await self._setbit_script(
+                keys=[self.BITS_KEY, self.META_KEY],
+                args=[size_bits, hash_count, *positions[start:start + self.SETBIT_BATCH]],
+                client=redis,
+            ))
+            if status != self.SET:
+                break
+        return status
+
+    async def add(self, redis: Redis, short_urls: List[str]):
+        if self._bits is None:
+            # Not loaded yet here, but other workers may already be rejecting with the shared bitmap
+            await self.load(redis)
+        for _ in range(self.MAX_ADD_ATTEMPTS):
+            size_bits, hash_count, positions = await self._add_local(short_urls)
+            if not positions:
+                break
+            if await self._set_shared_bits(redis, size_bits, hash_count, positions) != self.STALE:
+                break
+            # Another worker rebuilt the bitmap with a different size: pick it up and redo
+            await self.load(redis)
+        else:
+            logger.warning(f"Short code filter kept changing size; {len(short_urls)} codes rely on the next rebuild")
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.publish(self.EVENTS_CHANNEL, "+" + " ".join(short_urls))
+            pipe.delete(*[self.negative_key(short_url) for short_url in short_urls])
+            await pipe.execute()
+
+    def negative_key(self, short_url: str) -> str:
+        return f"{self.NEGATIVE_PREFIX}{short_url}"
+
+    async def remember_missing(self, redis: Redis, short_url: str):
+        await redis.set(self.negative_key(short_url), 1, ex=code_filter_config.negative_ttl)
+
+    async def remember_expired(self, redis: Redis, short_urls: List[str]):
+        # Expired rows stay in Postgres until the sweeper deletes them; without
+        # this every hit on one would be a SELECT until then
+        async with redis.pipeline(transaction=False) as pipe:
+            for short_url in short_urls:
+                pipe.set(self.negative_key(short_url), self.EXPIRED_MARKER, ex=code_filter_config.expired_ttl)
+            await pipe.execute()
+
+    async def load(self, redis: Redis) -> bool:
+        meta = await redis.hgetall(self.META_KEY)
+        if not meta:
+            return False
+        bits = await redis.execute_command("GET", self.BITS_KEY, **{NEVER_DECODE: True})
+        size_bits, hash_count = int(meta["size_bits"]), int(meta["hash_count"])
+        bitmap = bytearray(size_bits // 8)
+        bitmap[:len(bits or b"")] = bits or b""
+        async with self._lock:
+            self._bits, self.size_bits, self.hash_count = bitmap, size_bits, hash_count
+        return True
+
+    async def rebuild(self, redis: Redis):
+        started_at = datetime.utcnow()
+        codes = []
+        async with async_session() as db:
+            result = await db.stream_scalars(
+                select(ShortenedUrl.short_url).execution_options(yield_per=10_000)
+            )
+            async for short_url in result:
+                codes.append(short_url)
+
+        size_bits, hash_count = self.sizing(max(len(codes) * 2, code_filter_config.expected_items))
+
+        def build() -> bytearray:
+            # Hashing every live code takes seconds, so keep it off the event loop
+            bitmap = bytearray(size_bits // 8)
+            for short_url in codes:
+                self._set_bits(bitmap, self._positions(short_url, size_bits, hash_count))
+            return bitmap
+
+        bitmap = await asyncio.to_thread(build)
+
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.set(self.BITS_KEY, bytes(bitmap))
+            pipe.delete(self.META_KEY)
+            pipe.hset(self.META_KEY, mapping={"size_bits": size_bits, "hash_count": hash_count})
+            pipe.publish(self.EVENTS_CHANNEL, "reload")
+            await pipe.execute()
+        async with self._lock:
+            self._bits, self.size_bits, self.hash_count = bitmap, size_bits, hash_count
+
+        # Codes created while we were scanning may have set bits in the old bitmap
+        async with async_session() as db:
+            result = await db.execute(
+                select(ShortenedUrl.short_url).where(
+                    ShortenedUrl.created_at >= started_at - timedelta(seconds=5)
+                )
+            )
+            late_codes = list(result.scalars().all())
+        if late_codes:
+            await self.add(redis, late_codes)
+        logger.info(f"Rebuilt short code filter: {len(codes)} codes, {size_bits} bits, {hash_count} hashes")
+
+    async def _load_or_rebuild(self, redis: Redis):
+        # The first worker to boot rebuilds from ShortenedUrl, the rest load its result
+        while True:
+            if await redis.set(self.LOCK_KEY, 1, nx=True, ex=code_filter_config.rebuild_lock_ttl):
+                await self.rebuild(redis)
+                return
+            if await self.load(redis):
+                return
+            await asyncio.sleep(1)
+
+    async def listen_for_updates(self):
+        redis = await get_redis()
+        async with redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+            # Subscribe before loading so no add between the two is missed
+            await pubsub.subscribe(self.EVENTS_CHANNEL)
+            if self._bits is None:
+                await self._load_or_rebuild(redis)
+            else:
+                await self.load(redis)
+            async for message in pubsub.listen():
+                data = message["data"]
+                if data == "reload":
+                    await self.load(redis)
+                elif data.startswith("+"):
+                    await self._add_local(data[1:].split())
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self._bits is not None,
+            "size_bits": self.size_bits,
+            "hash_count": self.hash_count,
+            "rejected": self.rejected,
+            "negative_hits": self.negative_hits,
+        }
+
+
+code_filter = ShortCodeFilter()
@@ -1,7 +1,14 @@
-from sqlmodel import SQLModel
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterator, List
+
+from fastapi import Request
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session
 from core.config import database_config
+from services.metrics import DB_SESSION_REQUESTS, watch_engine_pool
 from sqlalchemy.orm import declarative_base
 
 DATABASE_URL = database_config.database_url
@@ -13,6 +20,7 @@ engine = create_async_engine(
     pool_size=database_config.pool_size,
     max_overflow=database_config.max_overflow,
 )
+watch_engine_pool(engine)
 
 # Base for your models
 
@@ -23,7 +31,97 @@ async_session = async_sessionmaker(
     expire_on_commit=False
 )
 Base = declarative_base()
-# Dependency for FastAPI routes
-async def get_session() -> AsyncSession:
+
+MAX_BIND_PARAMS = 32767
+
+
+class SessionMetrics:
+    # Per worker: requests that had a session, and how many of them actually
+    # checked a connection out of the pool. A session only does that on its first
+    # query, so requests answered from Redis show up as untouched.
+
+    def __init__(self):
+        self.requests = 0
+        self.touched = 0
+        self.routes: Dict[str, Dict[str, int]] = {}
+
+    def record(self, route: str, touched: bool):
+        self.requests += 1
+        self.touched += touched
+        counts = self.routes.setdefault(route, {"requests": 0, "touched": 0})
+        counts["requests"] += 1
+        counts["touched"] += touched
+        # /ops/db-stats only sees one worker of the API app; this series covers
+        # every worker of both apps
+        DB_SESSION_REQUESTS.labels(route, "true" if touched else "false").inc()
+
+    def stats(self) -> dict:
+        pool = engine.pool
+        return {
+            "requests": self.requests,
+            "db_touched": self.touched,
+            "db_untouched": self.requests - self.touched,
+            "untouched_ratio": (self.requests - self.touched) / self.requests if self.requests else 0.0,
+            "routes": self.routes,
+            "pool": {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "max_overflow": database_config.max_overflow,
+            },
+        }
+
+
+session_metrics = SessionMetrics()
+
+
+@event.listens_for(Session, "after_begin")
+def _mark_touched(session, transaction, connection):
+    session.info["touched"] = True
+
+
+@asynccontextmanager
+async def unit_of_work(route: str = "-") -> AsyncIterator[AsyncSession]:
     async with async_session() as session:
+        try:
+            yield session
+        finally:
+            session_metrics.record(route, session.info.get("touched", False))
+
+
+def insert_chunks(rows: List[dict]) -> Iterator[List[dict]]:
+    # Multi-row INSERTs sized to stay under Postgres' limit of 32767 bind
+    # parameters per statement (one per column per row)
+    if not rows:
+        return
+    chunk_size = MAX_BIND_PARAMS // len(rows[0])
+    for start in range(0, len(rows), chunk_size):
+        yield rows[start:start + chunk_size]
+
+
+async def release(session: AsyncSession):
+    # Give the connection back to the pool now instead of at the end of the
+    # request; the session stays usable and checks one out again if queried
+    await session.close()
+
+
+async def warm_up(connections: int):
+    # Open the worker's first connections before it takes traffic, so early
+    # requests don't each pay for a TCP + auth handshake
+    connections = min(connections, database_config.pool_size)
+    opened = await asyncio.gather(
+        *(engine.connect() for _ in range(connections)), return_exceptions=True
+    )
+    for connection in opened:
+        if not isinstance(connection, BaseException):
+            await connection.close()  # back to the pool, still open
+    for connection in opened:
+        if isinstance(connection, BaseException):
+            raise connection
+
+
+# Dependency for FastAPI routes
+async def get_session(request: Request) -> AsyncSession:
+    route = getattr(request.scope.get("route"), "path", request.url.path)
+    async with unit_of_work(route) as session:
         yield session
@@ -0,0 +1,116 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from redis.asyncio import Redis
+from sqlalchemy import delete, select, update
+
+from apps.shortener.models import ShortenedUrl
+from core.config import sweeper_config
+from services.click_counter import click_counter
+from services.click_stats import click_stats
+from services.code_filter import code_filter
+from services.database import async_session
+from services.redis import get_redis
+from services.url_cache import url_cache
+
+logger = logging.getLogger(__name__)
+
+
+class ExpirySweeper:
+    # Expired links are flagged (expired=True, active=False) in bounded batches and
+    # their Redis state dropped; flagged rows are deleted once delete_after has
+    # passed. Only one worker sweeps at a time.
+
+    LOCK_KEY = "sweeper:lock"
+    STATS_KEY = "sweeper:stats"
+
+    async def _mark_expired_batch(self, now: datetime) -> List[str]:
+        due = (
+            select(ShortenedUrl.id)
+            .where(ShortenedUrl.expires_at < now, ShortenedUrl.expired.is_(False))
+            .order_by(ShortenedUrl.expires_at)
+            .limit(sweeper_config.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        async with async_session() as db:
+            result = await db.execute(
+                update(ShortenedUrl)
+                .where(ShortenedUrl.id.in_(due.scalar_subquery()))
+                .values(expired=True, active=False, updated_at=now)
+                .returning(ShortenedUrl.short_url)
+            )
+            short_urls = list(result.scalars().all())
+            await db.commit()
+        return short_urls
+
+    async def _delete_flagged_batch(self, cutoff: datetime) -> List[str]:
+        due = (
+            select(ShortenedUrl.id)
+            .where(ShortenedUrl.expired, ShortenedUrl.updated_at < cutoff)
+            .limit(sweeper_config.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        async with async_session() as db:
+            result = await db.execute(
+                delete(ShortenedUrl)
+                .where(ShortenedUrl.id.in_(due.scalar_subquery()))
+                .returning(ShortenedUrl.short_url)
+            )
+            short_urls = list(result.scalars().all())
+            await db.commit()
+        return short_urls
+
+    async def _drop_redis_state(self, redis: Redis, short_urls: List[str]):
+        await url_cache.delete_many(redis, short_urls)
+        await click_counter.discard(redis, *short_urls)
+        await code_filter.remember_expired(redis, short_urls)
+
+    async def sweep(self):
+        redis = await get_redis()
+        if not await redis.set(self.LOCK_KEY, 1, nx=True, ex=sweeper_config.lock_ttl):
+            return
+
+        started = time.monotonic()
+        now = datetime.utcnow()
+        marked = deleted = 0
+        try:
+            for _ in range(sweeper_config.max_batches):
+                short_urls = await self._mark_expired_batch(now)
+                if short_urls:
+                    await self._drop_redis_state(redis, short_urls)
+                marked += len(short_urls)
+                if len(short_urls) < sweeper_config.batch_size:
+                    break
+
+            if sweeper_config.delete_after > 0:
+                cutoff = now - timedelta(seconds=sweeper_config.delete_after)
+                for _ in range(sweeper_config.max_batches):
+                    short_urls = await self._delete_flagged_batch(cutoff)
+                    if short_urls:
+                        await click_stats.discard(redis, *short_urls)
+                    deleted += len(short_urls)
+                    if len(short_urls) < sweeper_config.batch_size:
+                        break
+        finally:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.hincrby(self.STATS_KEY, "marked_total", marked)
+                pipe.hincrby(self.STATS_KEY, "deleted_total", deleted)
+                pipe.hset(self.STATS_KEY, mapping={
+                    "last_run_at": now.isoformat(),
+                    "last_run_seconds": round(time.monotonic() - started, 3),
+                    "last_marked": marked,
+                    "last_deleted": deleted,
+                })
+                pipe.delete(self.LOCK_KEY)
+                await pipe.execute()
+
+        if marked or deleted:
+            logger.info(f"Expiry sweep flagged {marked} and deleted {deleted} short URLs")
+
+    async def stats(self, redis: Redis) -> dict:
+        return await redis.hgetall(self.STATS_KEY)
+
+
+expiry_sweeper = ExpirySweeper()
@@ -1,23 +1,112 @@
-import httpx
-async def get_location_from_ip(ip: str):
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"http://ip-api.com/json/{ip}")
-            data = response.json()
-
-            if data["status"] == "success":
+import ipaddress
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Optional
+
+import geoip2.database
+import geoip2.errors
+from maxminddb import MODE_MMAP, InvalidDatabaseError
+
+from core.config import geo_config
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_LOCATION = {
+    "city": "Unknown",
+    "country": "Unknown",
+    "latitude": None,
+    "longitude": None
+}
+
+
+class GeoService:
+    # Offline lookups against a local MaxMind database. The .mmdb file is memory
+    # mapped once per process and picked up again whenever it changes on disk.
+
+    def __init__(self):
+        self._reader: Optional[geoip2.database.Reader] = None
+        self._is_city_db = False
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._lookup_network = lru_cache(maxsize=geo_config.cache_size)(self._lookup_uncached)
+
+    def reload(self, force: bool = True):
+        with self._lock:
+            try:
+                mtime = os.stat(geo_config.database_path).st_mtime
+            except OSError:
+                if self._mtime is not None or force:
+                    logger.warning(f"GeoIP database not found at {geo_config.database_path}")
+                self._swap(None, None)
+                return
+            if not force and mtime == self._mtime:
+                return
+            try:
+                reader = geoip2.database.Reader(geo_config.database_path, mode=MODE_MMAP)
+            except (OSError, InvalidDatabaseError, ValueError) as e:
+                # Typically a file still being copied in; keep the previous
+                # reader and try again at the next check
+                logger.warning(f"Could not load GeoIP database {geo_config.database_path}: {e}")
+                return
+            self._swap(reader, mtime)
+            logger.info(f"Loaded GeoIP database {geo_config.database_path}")
+
+    def _swap(self, reader: Optional[geoip2.database.Reader], mtime: Optional[float]):
+        old_reader, self._reader, self._mtime = self._reader, reader, mtime
+        self._is_city_db = reader is not None and "City" in reader.metadata().database_type
+        self._lookup_network.cache_clear()
+        if old_reader is not None:
+            old_reader.close()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at >= geo_config.reload_check_interval:
+            self._checked_at = now
+            self.reload(force=False)
+
+    @staticmethod
+    def _cache_key(ip: str) -> Optional[str]:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if not address.is_global:
+            return None
+        prefix = geo_config.ipv4_prefix if address.version == 4 else geo_config.ipv6_prefix
+        return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False).network_address)
+
+    def _lookup_uncached(self, network_address: str) -> dict:
+        reader = self._reader
+        if reader is None:
+            return UNKNOWN_LOCATION
+        try:
+            if self._is_city_db:
+                response = reader.city(network_address)
                 return {
-                    "city": data.get("city", "Unknown"),
-                    "country": data.get("country", "Unknown"),
-                    "latitude": data.get("lat"),
-                    "longitude": data.get("lon")
+                    "city": response.city.name or "Unknown",
+                    "country": response.country.name or "Unknown",
+                    "latitude": response.location.latitude,
+                    "longitude": response.location.longitude
                 }
-    except Exception as e:
-        print(f"Error fetching geolocation: {e}")
-
-    return {
-        "city": "Unknown",
-        "country": "Unknown",
-        "latitude": None,
-        "longitude": None
-    }
+            response = reader.country(network_address)
+            return {**UNKNOWN_LOCATION, "country": response.country.name or "Unknown"}
+        except (geoip2.errors.AddressNotFoundError, ValueError):
+            return UNKNOWN_LOCATION
+
+    def lookup(self, ip: str) -> dict:
+        self._maybe_reload()
+        # X-Forwarded-For may carry a proxy chain; the client is the first hop
+        network_address = self._cache_key(ip.split(",")[0].strip())
+        if network_address is None:
+            return UNKNOWN_LOCATION
+        return self._lookup_network(network_address)
+
+    def cache_info(self):
+        return self._lookup_network.cache_info()
+
+
+geo_service = GeoService()
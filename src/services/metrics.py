@@ -0,0 +1,157 @@
+import logging
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from redis.asyncio import Redis
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import visit_ingest_config
+
+logger = logging.getLogger(__name__)
+
+# Under gunicorn, PROMETHEUS_MULTIPROC_DIR makes every worker write its samples
+# to memory-mapped files there (see gunicorn.conf.py) and /metrics adds them up.
+# Without it the values are this process's own.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ["method", "route", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+REDIRECTS = Counter(
+    "redirect_outcomes_total",
+    "Redirect requests by outcome",
+    ["outcome"],  # hit, not_found, expired, click_limit, error
+)
+
+CACHE_LOOKUPS = Counter(
+    "redirect_cache_lookups_total",
+    "Redirect record lookups by cache tier and result",
+    ["tier", "result"],  # l1/redis: hit, miss; bloom: rejected; negative: hit
+)
+L1_HIT = CACHE_LOOKUPS.labels("l1", "hit")
+L1_MISS = CACHE_LOOKUPS.labels("l1", "miss")
+REDIS_HIT = CACHE_LOOKUPS.labels("redis", "hit")
+REDIS_MISS = CACHE_LOOKUPS.labels("redis", "miss")
+BLOOM_REJECT = CACHE_LOOKUPS.labels("bloom", "rejected")
+NEGATIVE_HIT = CACHE_LOOKUPS.labels("negative", "hit")
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Postgres connections in use", multiprocess_mode="livesum"
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Postgres connections open beyond pool_size", multiprocess_mode="livesum"
+)
+
+DB_SESSION_REQUESTS = Counter(
+    "db_session_requests_total",
+    "Requests that opened a database session, by whether it ever checked out a connection",
+    ["route", "touched"],  # touched: true, false
+)
+
+REDIS_POOL_IN_USE = Gauge(
+    "redis_pool_in_use", "Redis connections in use", multiprocess_mode="livesum"
+)
+REDIS_POOL_EXHAUSTED = Counter(
+    "redis_pool_exhausted_total", "Redis connection requests that timed out waiting for the pool"
+)
+
+PHASE_DURATION = Histogram(
+    "request_phase_duration_seconds",
+    "Time spent in each phase of a request (see services.timing)",
+    ["phase"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+
+VISIT_QUEUE_DEPTH = Gauge(
+    "visit_queue_depth",
+    "Visit events waiting in the ingestion streams",
+    ["stream"],  # stream, pending (delivered, not acked), dead
+    multiprocess_mode="mostrecent",
+)
+
+
+def watch_engine_pool(engine):
+    # Pool events instead of polling, so every worker's gauges stay current
+    pool = engine.sync_engine.pool
+
+    @event.listens_for(pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+        DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+    @event.listens_for(pool, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+        DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+
+async def update_visit_queue_depth(redis: Redis):
+    stream = visit_ingest_config.stream_key
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.xlen(stream)
+        pipe.xlen(f"{stream}:dead")
+        pipe.xpending(stream, visit_ingest_config.group)
+        length, dead, pending = await pipe.execute(raise_on_error=False)
+    for label, value in (("stream", length), ("dead", dead)):
+        if isinstance(value, int):
+            VISIT_QUEUE_DEPTH.labels(label).set(value)
+    if isinstance(pending, dict):
+        VISIT_QUEUE_DEPTH.labels("pending").set(pending.get("pending", 0))
+
+
+async def render(redis: Redis) -> bytes:
+    try:
+        await update_visit_queue_depth(redis)
+    except Exception as e:
+        logger.warning(f"Visit queue depth unavailable: {e}")
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+class MetricsMiddleware:
+    # Latency per route template (not per path, so /{short_url} is one series);
+    # requests that match no route are counted as "unmatched"
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status_code)
+            ).observe(time.perf_counter() - started)
@@ -0,0 +1,138 @@
+import logging
+import re
+from datetime import date, datetime
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from core.config import partition_config
+from services.database import engine
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r"^visitlog_y(\d{4})m(\d{2})$")
+
+
+def month_start(moment: date, months_ahead: int = 0) -> date:
+    index = moment.year * 12 + moment.month - 1 + months_ahead
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class VisitPartitionMaintenance:
+    # Keeps monthly VisitLog partitions ready premake_months ahead and retires
+    # those older than retention_months (detached, or detached and dropped).
+    # Every partition is its own transaction, so one that fails (and is retried
+    # next run) doesn't hold back the others or retention.
+    # Rollups and click counters are separate tables/keys and outlive the raw rows.
+
+    PARENT = "visitlog"
+    LOCK_ID = 0x7669_7369  # pg advisory lock shared by every worker
+
+    @staticmethod
+    def partition_name(month: date) -> str:
+        return f"visitlog_y{month.year:04d}m{month.month:02d}"
+
+    async def _existing_partitions(self, db) -> List[str]:
+        result = await db.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :parent"
+        ), {"parent": self.PARENT})
+        return list(result.scalars().all())
+
+    async def _step(self, conn, description: str, *statements: str, **params) -> bool:
+        # One transaction per step: a failure is logged and the remaining steps still run
+        try:
+            async with conn.begin():
+                for statement in statements:
+                    await conn.execute(text(statement), params)
+        except SQLAlchemyError:
+            logger.exception(f"VisitLog partition maintenance: {description} failed")
+            return False
+        return True
+
+    async def _create_partition(self, conn, month: date) -> bool:
+        name = self.partition_name(month)
+        bounds = f"FROM ('{month.isoformat()}') TO ('{month_start(month, 1).isoformat()}')"
+        default = f"{self.PARENT}_default"
+        in_range = "visited_at >= :start AND visited_at < :end"
+        params = {"start": month, "end": month_start(month, 1)}
+        try:
+            async with conn.begin():
+                result = await conn.execute(
+                    text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_range})"), params
+                )
+                stranded = result.scalar()
+        except SQLAlchemyError:
+            logger.exception(f"VisitLog partition maintenance: checking {default} for {name} failed")
+            return False
+        if not stranded:
+            return await self._step(
+                conn, f"creating {name}", f"CREATE TABLE {name} PARTITION OF {self.PARENT} FOR VALUES {bounds}"
+            )
+        # Postgres refuses a partition whose range overlaps rows already in the
+        # default one, so those rows move into it before it is attached
+        return await self._step(
+            conn,
+            f"creating {name} from rows in {default}",
+            f"CREATE TABLE {name} (LIKE {self.PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+            f"INSERT INTO {name} SELECT * FROM {default} WHERE {in_range}",
+            f"DELETE FROM {default} WHERE {in_range}",
+            f"ALTER TABLE {self.PARENT} ATTACH PARTITION {name} FOR VALUES {bounds}",
+            **params,
+        )
+
+    async def _retire_partition(self, conn, name: str) -> bool:
+        statements = [f"ALTER TABLE {self.PARENT} DETACH PARTITION {name}"]
+        if partition_config.retention_action == "drop":
+            statements.append(f"DROP TABLE {name}")
+        return await self._step(conn, f"retiring {name}", *statements)
+
+    async def maintain(self):
+        now = datetime.utcnow()
+        created, retired = [], []
+        # A session-level lock on one connection, since each step commits on its own
+        async with engine.connect() as conn:
+            locked = await conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": self.LOCK_ID})
+            await conn.commit()
+            if not locked.scalar():
+                return  # another worker is on it
+
+            try:
+                async with conn.begin():
+                    existing = set(await self._existing_partitions(conn))
+                if f"{self.PARENT}_default" not in existing:
+                    await self._step(
+                        conn, "creating the default partition",
+                        f"CREATE TABLE {self.PARENT}_default PARTITION OF {self.PARENT} DEFAULT",
+                    )
+
+                for months_ahead in range(partition_config.premake_months + 1):
+                    month = month_start(now, months_ahead)
+                    name = self.partition_name(month)
+                    if name not in existing and await self._create_partition(conn, month):
+                        created.append(name)
+
+                if partition_config.retention_months > 0:
+                    # Partitions entirely before this month are past retention
+                    cutoff = month_start(now, -partition_config.retention_months)
+                    for name in sorted(existing):
+                        match = PARTITION_NAME.match(name)
+                        if not match or date(int(match[1]), int(match[2]), 1) >= cutoff:
+                            continue
+                        if await self._retire_partition(conn, name):
+                            retired.append(name)
+            finally:
+                await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": self.LOCK_ID})
+                await conn.commit()
+
+        if created or retired:
+            logger.info(
+                f"VisitLog partitions created: {created or 'none'}; "
+                f"retired ({partition_config.retention_action}): {retired or 'none'}"
+            )
+
+
+partition_maintenance = VisitPartitionMaintenance()
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Dict, Optional
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class SamplingProfiler:
+    # Stdlib-only sampling profiler for live traffic: a background thread reads
+    # the event loop thread's stack every `interval` seconds and counts each
+    # distinct stack. The result is in the folded format ("a;b;c 42") that
+    # flamegraph.pl, speedscope and inferno turn into a flame graph.
+    #
+    # Only the worker that answers the request is profiled, and one capture
+    # runs at a time per worker.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    @staticmethod
+    def _label(frame: FrameType) -> str:
+        code = frame.f_code
+        filename = code.co_filename
+        if filename.startswith(SRC_DIR):
+            filename = os.path.relpath(filename, SRC_DIR)
+        else:
+            filename = os.path.basename(filename)
+        return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+    def _stack(self, frame: Optional[FrameType]) -> str:
+        labels = []
+        while frame is not None:
+            labels.append(self._label(frame))
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+    def capture(self, thread_id: int, seconds: float, interval: float) -> Dict[str, int]:
+        """Samples `thread_id` for `seconds`; blocks, so run it off the event loop."""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already being captured")
+        try:
+            stacks: Counter = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(thread_id)
+                if frame is not None:
+                    stacks[self._stack(frame)] += 1
+                time.sleep(interval)
+            return stacks
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def folded(stacks: Dict[str, int]) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+    async def profile(self, seconds: float, interval: float) -> str:
+        # Called on the event loop: sample this thread while it keeps serving
+        stacks = await asyncio.to_thread(self.capture, threading.get_ident(), seconds, interval)
+        return self.folded(stacks)
+
+
+sampling_profiler = SamplingProfiler()
@@ -0,0 +1,155 @@
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from redis.asyncio import Redis
+
+from apps.shortener.schemas import CachedShortenedUrl
+from core.config import visit_ingest_config
+from services.click_counter import click_counter
+from services.code_filter import code_filter
+from services.metrics import NEGATIVE_HIT, REDIS_HIT, REDIS_MISS
+from services.url_cache import url_cache
+
+
+class RedirectLookupService:
+    # Everything a redirect needs from Redis in one EVALSHA: the cached record
+    # (skipped when this worker's L1 already has it), the expiry check, one
+    # click of the max_clicks budget, a sliding TTL for links that never expire
+    # and the visit event for workers.visit_ingest.
+
+    # run() statuses
+    CONSUMED = 1
+    EXHAUSTED = 0
+    UNSEEDED = -1  # no running total in Redis yet, seed it from Postgres first
+    MISS = -2  # no record in Redis, look the code up in Postgres
+    KNOWN_MISSING = -3  # negative-cache hit
+    EXPIRED = -4  # also returned for an expired tombstone in the negative cache
+
+    # KEYS: url, negative, count, pending, exhausted, stream
+    # ARGV: short_url, now, fetch ("1" = read the record from KEYS[1]),
+    #       max_clicks, expires_at ("" = none), refresh_ttl, expired marker,
+    #       stream max length, event field/value pairs...
+    # Timestamps are naive UTC ISO strings as pydantic writes them, which order
+    # the same as strings and as datetimes.
+    SCRIPT = """
+    local raw = false
+    local max_clicks = tonumber(ARGV[4])
+    local expires_at = ARGV[5]
+    if ARGV[3] == '1' then
+        raw = redis.call('GET', KEYS[1])
+        if not raw then
+            local missing = redis.call('GET', KEYS[2])
+            if missing == ARGV[7] then
+                return {-4, false}
+            elseif missing then
+                return {-3, false}
+            end
+            return {-2, false}
+        end
+        local ok, record = pcall(cjson.decode, raw)
+        if not ok or type(record) ~= 'table' then
+            return {-2, false}
+        end
+        max_clicks = tonumber(record['max_clicks'])
+        expires_at = record['expires_at']
+        if type(expires_at) ~= 'string' then
+            expires_at = ''
+        end
+    end
+    if expires_at ~= '' and expires_at < ARGV[2] then
+        return {-4, raw}
+    end
+
+    -- one click of the budget; reaching it has the row marked expired in the background
+    local total = redis.call('GET', KEYS[3])
+    if not total then
+        return {-1, raw}
+    end
+    total = tonumber(total)
+    if max_clicks and total >= max_clicks then
+        redis.call('SADD', KEYS[5], ARGV[1])
+        return {0, raw}
+    end
+    total = redis.call('INCR', KEYS[3])
+    redis.call('HINCRBY', KEYS[4], ARGV[1], 1)
+    if max_clicks and total >= max_clicks then
+        redis.call('SADD', KEYS[5], ARGV[1])
+    end
+
+    -- keep links without an expiry cached while they are being clicked; only
+    -- rewritten once half the TTL has gone, not on every click
+    local refresh_ttl = tonumber(ARGV[6])
+    if expires_at == '' then
+        for _, key in ipairs({KEYS[1], KEYS[3]}) do
+            if redis.call('TTL', key) < refresh_ttl / 2 then
+                redis.call('EXPIRE', key, refresh_ttl)
+            end
+        end
+    end
+
+    -- capped so a stopped ingest worker can't grow Redis without bound
+    redis.call('XADD', KEYS[6], 'MAXLEN', '~', ARGV[8], '*', unpack(ARGV, 9))
+    return {1, raw}
+    """
+
+    def __init__(self):
+        self._script = None
+
+    async def run(
+        self,
+        redis: Redis,
+        short_url: str,
+        record: Optional[CachedShortenedUrl],
+        event: Dict[str, str],
+        now: datetime,
+    ) -> Tuple[int, Optional[CachedShortenedUrl]]:
+        """Spends one click and enqueues the visit; returns (status, record)."""
+        if record is not None and record.expires_at and record.expires_at < now:
+            return self.EXPIRED, record
+
+        if self._script is None:
+            # Runs via EVALSHA and re-loads itself on NOSCRIPT
+            self._script = redis.register_script(self.SCRIPT)
+        args = [
+            short_url,
+            now.isoformat(),
+            "1" if record is None else "0",
+            "" if record is None or record.max_clicks is None else record.max_clicks,
+            "" if record is None or record.expires_at is None else record.expires_at.isoformat(),
+            url_cache.MAX_CACHE_TTL,
+            code_filter.EXPIRED_MARKER,
+            visit_ingest_config.max_length,
+        ]
+        for field, value in event.items():
+            args += [field, value]
+
+        status, raw = await self._script(
+            keys=[
+                url_cache.key(short_url),
+                code_filter.negative_key(short_url),
+                click_counter.count_key(short_url),
+                click_counter.PENDING_KEY,
+                click_counter.EXHAUSTED_KEY,
+                visit_ingest_config.stream_key,
+            ],
+            args=args,
+            client=redis,
+        )
+        status = int(status)
+        if record is not None:
+            return status, record
+
+        if raw is None:
+            REDIS_MISS.inc()
+            if status in (self.KNOWN_MISSING, self.EXPIRED):
+                code_filter.negative_hits += 1
+                NEGATIVE_HIT.inc()
+            return status, None
+        REDIS_HIT.inc()
+        record = url_cache.load(raw, now)
+        if record is None:
+            return self.MISS, None
+        return status, record
+
+
+redirect_lookup = RedirectLookupService()
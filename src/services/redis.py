@@ -1,21 +1,106 @@
 import asyncio
+import time
+from typing import Optional
 
-from redis.asyncio import Redis, ConnectionPool
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.exceptions import ConnectionError
 
 from core.config import redis_config
+from services.metrics import REDIS_POOL_EXHAUSTED, REDIS_POOL_IN_USE
 
-redis_pool: ConnectionPool = ConnectionPool.from_url(
-    redis_config.redis_url,
-    decode_responses=redis_config.decode_responses,
-    max_connections=redis_config.max_connections
-)
-redis_semaphore = asyncio.Semaphore(redis_config.max_connections)
 
+class InstrumentedConnectionPool(BlockingConnectionPool):
+    # Callers queue for a connection instead of failing with "Too many
+    # connections"; how long they queue is what the pool stats report.
 
-async def get_redis() -> Redis:
-    await redis_semaphore.acquire()
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.acquired = 0
+        self.exhausted = 0  # gave up after REDIS_POOL_TIMEOUT seconds
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def get_connection(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        except ConnectionError as e:
+            if isinstance(e.__cause__, asyncio.TimeoutError):
+                self.exhausted += 1
+                REDIS_POOL_EXHAUSTED.inc()
+            raise
+        waited = time.perf_counter() - started
+        self.acquired += 1
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        REDIS_POOL_IN_USE.inc()
+        return connection
+
+    async def release(self, connection):
+        await super().release(connection)
+        REDIS_POOL_IN_USE.dec()
+
+    def stats(self) -> dict:
+        in_use = len(self._in_use_connections)
+        return {
+            "max_connections": self.max_connections,
+            "in_use": in_use,
+            "idle": len(self._available_connections),
+            "utilization": in_use / self.max_connections,
+            "acquired": self.acquired,
+            "exhausted": self.exhausted,
+            "avg_wait_ms": self.wait_seconds / self.acquired * 1000 if self.acquired else 0.0,
+            "max_wait_ms": self.max_wait_seconds * 1000,
+        }
+
+
+# One client per process, created by the app's lifespan (or on first use in
+# workers and scripts) so the pool belongs to the running event loop
+redis_pool: Optional[InstrumentedConnectionPool] = None
+redis_client: Optional[Redis] = None
+
+
+def init_redis() -> Redis:
+    global redis_pool, redis_client
+    if redis_client is None:
+        redis_pool = InstrumentedConnectionPool.from_url(
+            redis_config.redis_url,
+            decode_responses=redis_config.decode_responses,
+            max_connections=redis_config.max_connections,
+            timeout=redis_config.pool_timeout,
+            health_check_interval=redis_config.health_check_interval,
+            socket_keepalive=True,
+        )
+        redis_client = Redis(connection_pool=redis_pool)
+    return redis_client
+
+
+async def close_redis():
+    global redis_pool, redis_client
+    if redis_client is None:
+        return
+    await redis_client.aclose()
+    await redis_pool.disconnect()
+    redis_pool = None
+    redis_client = None
+
+
+async def warm_up(connections: int):
+    init_redis()
+    opened = []
     try:
-        return Redis(connection_pool=redis_pool)
+        for _ in range(min(connections, redis_config.max_connections)):
+            opened.append(await redis_pool.get_connection())
     finally:
-        redis_semaphore.release()
-        
+        for connection in opened:
+            await redis_pool.release(connection)
+
+
+async def get_redis() -> Redis:
+    return redis_client or init_redis()
+
+
+def redis_pool_stats() -> dict:
+    if redis_pool is None:
+        return {"max_connections": redis_config.max_connections, "in_use": 0, "idle": 0}
+    return redis_pool.stats()
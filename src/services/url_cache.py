@@ -0,0 +1,226 @@
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional
+
+from redis.asyncio import Redis
+from sqlalchemy import or_
+from sqlmodel import select
+
+from apps.shortener.models import ShortenedUrl
+from apps.shortener.schemas import CachedShortenedUrl
+from core.config import url_cache_config
+from services.database import async_session
+from services.metrics import L1_HIT, L1_MISS
+from services.redis import get_redis
+
+
+class LocalUrlCache:
+    # Per-worker TTL + LRU cache in front of Redis, bounded by entry count and
+    # by an estimate of the memory the cached records take.
+
+    ENTRY_OVERHEAD = 400  # bytes for the model, dict slot and tuple around each record
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, tuple[float, CachedShortenedUrl, int]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @classmethod
+    def _size_of(cls, record: CachedShortenedUrl) -> int:
+        return (
+            cls.ENTRY_OVERHEAD
+            + sys.getsizeof(record.main_url)
+            + sys.getsizeof(record.short_url)
+            + sys.getsizeof(record.custom_domain or "")
+        )
+
+    def get(self, short_url: str) -> Optional[CachedShortenedUrl]:
+        entry = self._entries.get(short_url)
+        if entry is None:
+            self.misses += 1
+            L1_MISS.inc()
+            return None
+        if entry[0] < time.monotonic():
+            self._pop(short_url)
+            self.expirations += 1
+            self.misses += 1
+            L1_MISS.inc()
+            return None
+        self._entries.move_to_end(short_url)
+        self.hits += 1
+        L1_HIT.inc()
+        return entry[1]
+
+    def set(self, record: CachedShortenedUrl, ttl: float):
+        self._pop(record.short_url)
+        size = self._size_of(record)
+        self._entries[record.short_url] = (time.monotonic() + ttl, record, size)
+        self.bytes += size
+        while self._entries and (
+            len(self._entries) > url_cache_config.l1_max_entries
+            or self.bytes > url_cache_config.l1_max_bytes
+        ):
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def _pop(self, short_url: str) -> bool:
+        entry = self._entries.pop(short_url, None)
+        if entry is None:
+            return False
+        self.bytes -= entry[2]
+        return True
+
+    def invalidate(self, short_url: str):
+        if self._pop(short_url):
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": url_cache_config.l1_max_entries,
+            "bytes": self.bytes,
+            "max_bytes": url_cache_config.l1_max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class UrlCacheService:
+
+    KEY_PREFIX = "url:"
+    HOT_KEY = "url:hot"  # most-clicked codes, shared by workers warming up
+    INVALIDATION_CHANNEL = "url:invalidate"
+    MAX_CACHE_TTL = 30 * 24 * 60 * 60  # 30 days in seconds
+
+    def __init__(self):
+        self.local = LocalUrlCache()
+
+    def key(self, short_url: str) -> str:
+        return f"{self.KEY_PREFIX}{short_url}"
+
+    @staticmethod
+    def from_model(shortened_url: ShortenedUrl) -> CachedShortenedUrl:
+        return CachedShortenedUrl(
+            main_url=shortened_url.main_url,
+            short_url=shortened_url.short_url,
+            custom_domain=shortened_url.custom_domain,
+            max_clicks=shortened_url.max_clicks,
+            expires_at=shortened_url.expires_at,
+        )
+
+    def ttl_for(self, record: CachedShortenedUrl, now: datetime) -> int:
+        if record.expires_at is None:
+            return self.MAX_CACHE_TTL
+        ttl = int((record.expires_at - now).total_seconds())
+        return max(1, min(ttl, self.MAX_CACHE_TTL))
+
+    def _remember(self, record: CachedShortenedUrl, now: datetime):
+        self.local.set(record, min(url_cache_config.l1_ttl, self.ttl_for(record, now)))
+
+    def load(self, raw: str, now: datetime) -> Optional[CachedShortenedUrl]:
+        # A record read from Redis, kept in this worker's L1 as well
+        try:
+            record = CachedShortenedUrl.model_validate_json(raw)
+        except ValueError:
+            # Unreadable entry (e.g. written by an older release) - treat as a miss
+            return None
+        self._remember(record, now)
+        return record
+
+    async def set(self, redis: Redis, record: CachedShortenedUrl, now: Optional[datetime] = None):
+        now = now or datetime.utcnow()
+        await redis.set(
+            self.key(record.short_url),
+            record.model_dump_json(),
+            ex=self.ttl_for(record, now),
+        )
+        self._remember(record, now)
+
+    async def set_many(self, redis: Redis, records: List[CachedShortenedUrl], now: Optional[datetime] = None):
+        # Redis only: a bulk create shouldn't push hot records out of this worker's L1
+        now = now or datetime.utcnow()
+        async with redis.pipeline(transaction=False) as pipe:
+            for record in records:
+                pipe.set(self.key(record.short_url), record.model_dump_json(), ex=self.ttl_for(record, now))
+            await pipe.execute()
+
+    async def delete(self, redis: Redis, short_url: str):
+        await self.delete_many(redis, [short_url])
+
+    async def delete_many(self, redis: Redis, short_urls: List[str]):
+        async with redis.pipeline(transaction=False) as pipe:
+            for short_url in short_urls:
+                self.local.invalidate(short_url)
+                pipe.delete(self.key(short_url))
+                pipe.publish(self.INVALIDATION_CHANNEL, short_url)
+            await pipe.execute()
+
+    async def warm(self, redis: Redis, limit: int, hot_list_ttl: int) -> int:
+        # Load the most-clicked links into this worker's L1 before it takes
+        # traffic. Only the first worker to boot asks Postgres which those are.
+        limit = min(limit, url_cache_config.l1_max_entries)
+        if limit <= 0:
+            return 0
+        short_urls = await redis.lrange(self.HOT_KEY, 0, limit - 1)
+        if not short_urls:
+            short_urls = await self._publish_hot(redis, limit, hot_list_ttl)
+        if not short_urls:
+            return 0
+
+        now = datetime.utcnow()
+        raws = await redis.mget([self.key(short_url) for short_url in short_urls])
+        return sum(1 for raw in raws if raw is not None and self.load(raw, now) is not None)
+
+    async def _publish_hot(self, redis: Redis, limit: int, hot_list_ttl: int) -> List[str]:
+        now = datetime.utcnow()
+        async with async_session() as db:
+            result = await db.execute(
+                select(ShortenedUrl)
+                .where(
+                    ShortenedUrl.active,
+                    ShortenedUrl.expired.is_(False),
+                    or_(ShortenedUrl.expires_at.is_(None), ShortenedUrl.expires_at > now),
+                )
+                # Walks ix_shortenedurl_live_click_count backwards instead of sorting the table
+                .order_by(ShortenedUrl.click_count.desc())
+                .limit(limit)
+            )
+            records = [self.from_model(row) for row in result.scalars().all()]
+        if not records:
+            return []
+
+        await self.set_many(redis, records, now)
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self.HOT_KEY)
+            pipe.rpush(self.HOT_KEY, *[record.short_url for record in records])
+            pipe.expire(self.HOT_KEY, hot_list_ttl)
+            await pipe.execute()
+        return [record.short_url for record in records]
+
+    async def listen_for_invalidations(self):
+        redis = await get_redis()
+        async with redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+            await pubsub.subscribe(self.INVALIDATION_CHANNEL)
+            # Anything published while we were not subscribed is lost, so start clean
+            self.local.clear()
+            async for message in pubsub.listen():
+                self.local.invalidate(message["data"])
+
+
+url_cache = UrlCacheService()
@@ -0,0 +1,127 @@
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import user_agents
+from redis.asyncio import Redis
+
+from core.config import user_agent_config
+from services.timing import phase
+
+# (device, os, browser) as stored on VisitLog
+Classification = Tuple[str, str, str]
+
+
+class UserAgentService:
+    # Real traffic repeats a few hundred UA strings, so the regex cascade in
+    # user_agents.parse only has to run once per distinct string and process.
+
+    REDIS_PREFIX = "ua:"
+    SEPARATOR = "\t"
+
+    def __init__(self):
+        self._cache: "OrderedDict[str, Classification]" = OrderedDict()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def parse(ua_string: str) -> Classification:
+        with phase("ua_parse"):
+            ua = user_agents.parse(ua_string)
+        device = (
+            "Mobile" if ua.is_mobile
+            else "Tablet" if ua.is_tablet
+            else "PC" if ua.is_pc
+            else "Other"
+        )
+        os = ua.os.family if ua.os.family else "Other"
+        browser = ua.browser.family if ua.browser.family else "Other"
+        return device, os, browser
+
+    def _remember(self, ua_string: str, classification: Classification):
+        self._cache[ua_string] = classification
+        if len(self._cache) > user_agent_config.cache_size:
+            self._cache.popitem(last=False)
+
+    def _cached(self, ua_string: str) -> Optional[Classification]:
+        classification = self._cache.get(ua_string)
+        if classification is not None:
+            self._cache.move_to_end(ua_string)
+        return classification
+
+    def redis_key(self, ua_string: str) -> str:
+        digest = hashlib.blake2b(ua_string.encode(), digest_size=16).hexdigest()
+        return f"{self.REDIS_PREFIX}{digest}"
+
+    def classify(self, ua_string: str) -> Classification:
+        classification = self._cached(ua_string)
+        if classification is not None:
+            self.hits += 1
+            return classification
+        self.misses += 1
+        classification = self.parse(ua_string)
+        self._remember(ua_string, classification)
+        return classification
+
+    async def classify_many(self, ua_strings: Iterable[str], redis: Optional[Redis] = None) -> List[Classification]:
+        ua_strings = list(ua_strings)
+        resolved: Dict[str, Classification] = {}
+        missing = []
+        for ua_string in dict.fromkeys(ua_strings):
+            classification = self._cached(ua_string)
+            if classification is None:
+                missing.append(ua_string)
+            else:
+                resolved[ua_string] = classification
+
+        redis_hits = 0
+        use_redis = redis is not None and user_agent_config.redis_tier
+        if missing and use_redis:
+            # Shared tier: UAs any worker has classified within redis_ttl
+            values = await redis.mget([self.redis_key(ua_string) for ua_string in missing])
+            still_missing = []
+            for ua_string, value in zip(missing, values):
+                if value is None:
+                    still_missing.append(ua_string)
+                    continue
+                classification = tuple(value.split(self.SEPARATOR))
+                resolved[ua_string] = classification
+                self._remember(ua_string, classification)
+                redis_hits += 1
+            missing = still_missing
+
+        for ua_string in missing:
+            classification = self.parse(ua_string)
+            resolved[ua_string] = classification
+            self._remember(ua_string, classification)
+
+        if missing and use_redis:
+            async with redis.pipeline(transaction=False) as pipe:
+                for ua_string in missing:
+                    pipe.set(
+                        self.redis_key(ua_string),
+                        self.SEPARATOR.join(resolved[ua_string]),
+                        ex=user_agent_config.redis_ttl,
+                    )
+                await pipe.execute()
+
+        # Repeats within the batch are served from memory, so they count as hits
+        self.misses += len(missing)
+        self.redis_hits += redis_hits
+        self.hits += len(ua_strings) - len(missing) - redis_hits
+        return [resolved[ua_string] for ua_string in ua_strings]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.redis_hits + self.misses
+        return {
+            "size": len(self._cache),
+            "max_size": user_agent_config.cache_size,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.redis_hits) / lookups if lookups else 0.0,
+        }
+
+
+user_agent_service = UserAgentService()
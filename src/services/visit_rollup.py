@@ -0,0 +1,160 @@
+import logging
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import func, literal, literal_column, select, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from apps.shortener.models import RollupWatermark, VisitLog, VisitRollup
+from core.config import rollup_config
+from services.database import async_session
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ("country", "device", "os", "browser")
+UNKNOWN_VALUE = "Unknown"
+MAX_ID = 2 ** 63 - 1
+
+
+class VisitRollupService:
+    # Folds VisitLog rows into VisitRollup a batch at a time. The watermark is the
+    # last VisitLog id rolled up; rows newer than `lag` are left for the next run
+    # so a transaction that took a lower id but commits late is not skipped.
+
+    WATERMARK = "visit-rollup"
+
+    async def _claim_watermark(self, db: AsyncSession):
+        await db.execute(
+            pg_insert(RollupWatermark)
+            .values(name=self.WATERMARK, last_id=0, updated_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+        # The row lock makes concurrent runs (one per API worker) skip instead of double counting
+        result = await db.execute(
+            select(RollupWatermark)
+            .where(RollupWatermark.name == self.WATERMARK)
+            .with_for_update(skip_locked=True)
+        )
+        return result.scalars().first()
+
+    async def _next_upper_id(self, db: AsyncSession, last_id: int) -> int:
+        # created_at is set by Postgres at insert time, so the lag is measured on
+        # the database's clock from when the row was written, not enriched
+        cutoff = func.timezone("utc", func.now()) - timedelta(seconds=rollup_config.lag)
+        # Never step past a row that is already visible but still too young
+        first_young_id = (
+            select(func.min(VisitLog.id))
+            .where(VisitLog.id > last_id, VisitLog.created_at >= cutoff)
+            .scalar_subquery()
+        )
+        ids = (
+            select(VisitLog.id)
+            .where(
+                VisitLog.id > last_id,
+                VisitLog.created_at < cutoff,
+                VisitLog.id < func.coalesce(first_young_id, MAX_ID),
+            )
+            .order_by(VisitLog.id)
+            .limit(rollup_config.batch_size)
+            .subquery()
+        )
+        result = await db.execute(select(func.max(ids.c.id)))
+        return result.scalar() or last_id
+
+    @staticmethod
+    def _rollup_statement(granularity: str, lower_id: int, upper_id: int):
+        # One row per (visit, dimension), then grouped into buckets and added onto the existing counts
+        visits = union_all(*[
+            select(
+                VisitLog.short_url,
+                VisitLog.visited_at,
+                literal(dimension).label("dimension"),
+                func.coalesce(getattr(VisitLog, dimension), UNKNOWN_VALUE).label("value"),
+            ).where(VisitLog.id > lower_id, VisitLog.id <= upper_id)
+            for dimension in DIMENSIONS
+        ]).subquery("visits")
+        bucket = func.date_trunc(literal_column(f"'{granularity}'"), visits.c.visited_at)
+        grouped = (
+            select(
+                visits.c.short_url,
+                literal(granularity),
+                visits.c.dimension,
+                bucket,
+                visits.c.value,
+                func.count(),
+            )
+            .group_by(visits.c.short_url, visits.c.dimension, bucket, visits.c.value)
+        )
+        statement = pg_insert(VisitRollup).from_select(
+            ["short_url", "granularity", "dimension", "bucket", "value", "clicks"], grouped
+        )
+        return statement.on_conflict_do_update(
+            index_elements=["short_url", "granularity", "dimension", "bucket", "value"],
+            set_={"clicks": VisitRollup.clicks + statement.excluded.clicks},
+        )
+
+    async def _roll_up_batch(self) -> int:
+        async with async_session() as db:
+            watermark = await self._claim_watermark(db)
+            if watermark is None:
+                await db.rollback()  # another worker is rolling up
+                return 0
+            lower_id = watermark.last_id
+            upper_id = await self._next_upper_id(db, lower_id)
+            if upper_id == lower_id:
+                await db.commit()
+                return 0
+
+            for granularity in ("hour", "day"):
+                await db.execute(self._rollup_statement(granularity, lower_id, upper_id))
+            watermark.last_id = upper_id
+            watermark.updated_at = datetime.utcnow()
+            db.add(watermark)
+            await db.commit()
+        return upper_id - lower_id
+
+    async def roll_up(self):
+        advanced = 0
+        for _ in range(rollup_config.max_batches):
+            ids = await self._roll_up_batch()
+            advanced += ids
+            if ids < rollup_config.batch_size:
+                break
+        if advanced:
+            logger.info(f"Visit rollup advanced the watermark by {advanced} ids")
+
+    async def breakdown(
+        self,
+        db: AsyncSession,
+        short_url: str,
+        dimension: str,
+        granularity: str,
+        start: datetime,
+        end: datetime,
+    ) -> List[dict]:
+        clicks = func.sum(VisitRollup.clicks).label("clicks")
+        result = await db.execute(
+            select(VisitRollup.value, clicks)
+            .where(
+                VisitRollup.short_url == short_url,
+                VisitRollup.granularity == granularity,
+                VisitRollup.dimension == dimension,
+                VisitRollup.bucket >= start,
+                VisitRollup.bucket <= end,
+            )
+            .group_by(VisitRollup.value)
+            .order_by(clicks.desc(), VisitRollup.value)
+            .limit(rollup_config.max_values)
+        )
+        return [{"value": value, "clicks": int(count)} for value, count in result.all()]
+
+    async def watermark(self, db: AsyncSession) -> dict:
+        result = await db.execute(select(RollupWatermark).where(RollupWatermark.name == self.WATERMARK))
+        watermark = result.scalars().first()
+        if watermark is None:
+            return {"last_id": 0, "updated_at": None}
+        return {"last_id": watermark.last_id, "updated_at": watermark.updated_at.isoformat()}
+
+
+visit_rollup = VisitRollupService()
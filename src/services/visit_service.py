@@ -1,15 +1,24 @@
-from typing import Optional
-from unittest import result
-
-from sqlalchemy import select
+import csv
+import io
+import json
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select, tuple_
+from redis.asyncio import Redis
 import httpx
 import socket
-import user_agents
 from sqlmodel.ext.asyncio.session import AsyncSession
 from apps.shortener.models import VisitLog
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from fastapi import Request
 
+from core.config import pagination_config, partition_config
+from services.database import async_session, insert_chunks
+from services.location_service import geo_service
+from services.timing import phase
+from services.user_agent_service import user_agent_service
+from utils.pagination import decode_cursor, encode_cursor, split_page
 from utils.system_utils import get_system_id
 
 
@@ -32,72 +41,135 @@ async def get_public_ip():
 
 class VisitService:
 
-    async def log_visit(
+    def __init__(self):
+        self._public_ip: Optional[str] = None
+
+    @staticmethod
+    def visit_event(request: Request, short_code: str) -> Dict[str, str]:
+        # Only the raw event is queued; workers.visit_ingest enriches and stores it
+        return {
+            "code": short_code,
+            "ip": request.headers.get("X-Forwarded-For", request.client.host),
+            "ua": request.headers.get("user-agent", "Unknown"),
+            "ts": str(time.time()),
+            "sid": get_system_id(),
+        }
+
+    async def _resolve_ip(self, client_ip: str) -> str:
+        if client_ip != "127.0.0.1":
+            return client_ip
+        if self._public_ip is None:
+            with phase("public_ip"):
+                self._public_ip = await get_public_ip()
+        return self._public_ip
+
+    async def enrich(self, events: List[Dict[str, str]], redis: Optional[Redis] = None) -> List[dict]:
+        classifications = await user_agent_service.classify_many(
+            [event.get("ua", "Unknown") for event in events], redis
+        )
+
+        rows = []
+        for event, (device, os, browser) in zip(events, classifications):
+            client_ip = await self._resolve_ip(event.get("ip", "127.0.0.1"))
+            with phase("geo"):
+                location = geo_service.lookup(client_ip)
+            rows.append({
+                "short_url": event["code"],
+                "client_ip": client_ip,
+                "system_id": event.get("sid"),
+                "city": location["city"],
+                "country": location["country"],
+                "latitude": location["latitude"],
+                "longitude": location["longitude"],
+                "device": device,
+                "os": os,
+                "browser": browser,
+                "visited_at": datetime.utcfromtimestamp(float(event["ts"])),
+            })
+        return rows
+
+    async def write_batch(self, db: AsyncSession, rows: List[dict]):
+        if not rows:
+            return
+        for chunk in insert_chunks(rows):
+            await db.execute(insert(VisitLog).values(chunk))
+        await db.commit()
+
+    @staticmethod
+    def visited_range(since: Optional[datetime], until: Optional[datetime]):
+        # Always bound visited_at so Postgres only opens the partitions in range.
+        # visited_at is naive UTC, so aware bounds are converted.
+        if since is not None and since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        if until is not None and until.tzinfo is not None:
+            until = until.astimezone(timezone.utc).replace(tzinfo=None)
+        until = until or datetime.utcnow()
+        since = since or until - timedelta(days=partition_config.default_lookback_days)
+        return VisitLog.visited_at >= since, VisitLog.visited_at <= until
+
+    async def get_visits_by_client_ip(
         self,
         db: AsyncSession,
-        request: Request,
-        short_code: str,
-    ):
-        
-        system_id = get_system_id()
-
-        client_ip = request.headers.get("X-Forwarded-For", request.client.host)
-        if client_ip == "127.0.0.1":
-            client_ip = await get_public_ip()
-
-        system_id = get_system_id()
-
-        user_agent_string = request.headers.get("user-agent", "Unknown")
-        ua = user_agents.parse(user_agent_string)
-
-        device = (
-            "Mobile" if ua.is_mobile
-            else "Tablet" if ua.is_tablet
-            else "PC" if ua.is_pc
-            else "Other"
-        )
-        os = ua.os.family if ua.os.family else "Other"
-        browser = ua.browser.family if ua.browser.family else "Other"
-
-        city, country = "Unknown", "Unknown"
-        latitude, longitude = None, None
-
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"https://ipapi.co/{client_ip}/json/")
-                if response.status_code == 200:
-                    data = response.json()
-                    city = data.get("city", "Unknown")
-                    country = data.get("country_name", "Unknown")
-                    latitude = data.get("latitude")
-                    longitude = data.get("longitude")
-        except Exception as e:
-            print(f"Geo lookup failed: {e}")
-
-        print(f"IP: {client_ip}, City: {city}, Country: {country}, OS: {os}, Browser: {browser}, Device: {device}")
-
-
-        visit = VisitLog(
-            short_url=short_code,
-            client_ip=client_ip,
-            city=city,
-            country=country,
-            latitude=latitude,
-            longitude=longitude,
-            device=device,
-            os=os,
-            browser=browser,
-            visited_at=datetime.utcnow(),
-            system_id =system_id
+        client_ip: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = pagination_config.default_limit,
+    ) -> Tuple[List[VisitLog], Optional[str]]:
+        # Newest first, keyset on (visited_at, id) so each page is one seek on
+        # ix_visitlog_client_ip_visited_at
+        statement = (
+            select(VisitLog)
+            .where(VisitLog.client_ip == client_ip, *self.visited_range(since, until))
+            .order_by(VisitLog.visited_at.desc(), VisitLog.id.desc())
+            .limit(limit + 1)
         )
+        after = decode_cursor(cursor, datetime, int)
+        if after:
+            statement = statement.where(tuple_(VisitLog.visited_at, VisitLog.id) < after)
 
-        db.add(visit)
-        await db.commit()
-        
-    async def get_visits_by_client_ip(self, db: AsyncSession, client_ip: str):
-        result = await db.execute(
-            select(VisitLog).where(VisitLog.client_ip == client_ip)
+        result = await db.execute(statement)
+        visits, has_more = split_page(result.scalars().all(), limit)
+        next_cursor = encode_cursor(visits[-1].visited_at, visits[-1].id) if has_more else None
+        return visits, next_cursor
+
+    async def export_visits_by_client_ip(
+        self,
+        client_ip: str,
+        export_format: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> AsyncIterator[bytes]:
+        # Rows come through a server-side cursor, export_batch_size at a time, as
+        # plain tuples (no ORM identity map), so memory stays flat however many
+        # rows match. The session is our own: the request's is closed before a
+        # streaming body is sent.
+        columns = list(VisitLog.__table__.columns)
+        names = [column.name for column in columns]
+        statement = (
+            select(*columns)
+            .where(VisitLog.client_ip == client_ip, *self.visited_range(since, until))
+            .order_by(VisitLog.visited_at, VisitLog.id)
+            .execution_options(yield_per=pagination_config.export_batch_size)
         )
-        return result.scalars().all()
+
+        if export_format == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(names)
+            yield buffer.getvalue().encode()
+
+        async with async_session() as db:
+            result = await db.stream(statement)
+            async for rows in result.partitions():
+                rows = [
+                    [value.isoformat() if isinstance(value, datetime) else value for value in row]
+                    for row in rows
+                ]
+                if export_format == "csv":
+                    buffer = io.StringIO()
+                    csv.writer(buffer).writerows(rows)
+                    yield buffer.getvalue().encode()
+                else:
+                    yield "".join(json.dumps(dict(zip(names, row))) + "\n" for row in rows).encode()
 
 visit_service = VisitService()
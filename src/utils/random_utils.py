@@ -0,0 +1,14 @@
+import random
+import string
+
+
+def generate_random_characters(length: int) -> str:
+    if length < 2:
+        raise ValueError("Length must be at least 2 to include both letter and digit.")
+    letters = string.ascii_letters
+    digits = string.digits
+    char_set = letters + digits
+    code = [random.choice(letters), random.choice(digits)] + \
+           [random.choice(char_set) for _ in range(length - 2)]
+    random.shuffle(code)
+    return ''.join(code)
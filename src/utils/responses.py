@@ -1,8 +1,32 @@
-from pydantic import BaseModel
+from decimal import Decimal
+from typing import Any, Type
 
-from typing import Any
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
 
 
 class ResponseStructure(BaseModel):
     details: Any
     status_code: int
+
+
+def _orjson_default(value: Any) -> Any:
+    # orjson handles datetime, date, UUID, enums and dataclasses itself; this
+    # covers pydantic/SQLModel objects (ORM rows included) and Decimals
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    # The compact UTF-8 JSON that JSONResponse produces, rendered by orjson
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def default_response_class(fast_json: bool) -> Type[JSONResponse]:
+    return FastJSONResponse if fast_json else JSONResponse
@@ -0,0 +1,154 @@
+# src/workers/visit_ingest.py
+# Run from src/:  python -m workers.visit_ingest
+import asyncio
+import logging
+import os
+import signal
+import socket
+import time
+from typing import List, Tuple
+
+from prometheus_client import start_http_server
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from core.config import visit_ingest_config
+from services.click_stats import click_stats
+from services.database import async_session, engine
+from services.location_service import geo_service
+from services.redis import close_redis, get_redis
+from services.user_agent_service import user_agent_service
+from services.visit_service import visit_service
+
+logger = logging.getLogger(__name__)
+
+DEAD_LETTER_SUFFIX = ":dead"
+STATS_LOG_INTERVAL = 60  # seconds
+
+Entry = Tuple[str, dict]
+
+
+class VisitIngestWorker:
+
+    def __init__(self, redis: Redis, consumer: str):
+        self.redis = redis
+        self.consumer = consumer
+        self.stream = visit_ingest_config.stream_key
+        self.group = visit_ingest_config.group
+        self.stopping = asyncio.Event()
+        self.stats_logged_at = time.monotonic()
+
+    async def ensure_group(self):
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read_batch(self) -> List[Entry]:
+        # Events another consumer took but never acked (it crashed or its batch failed)
+        _, claimed, *_ = await self.redis.xautoclaim(
+            self.stream,
+            self.group,
+            self.consumer,
+            min_idle_time=visit_ingest_config.claim_idle_ms,
+            count=visit_ingest_config.batch_size,
+        )
+        if claimed:
+            return await self._drop_poison(claimed)
+
+        response = await self.redis.xreadgroup(
+            self.group,
+            self.consumer,
+            {self.stream: ">"},
+            count=visit_ingest_config.batch_size,
+            block=visit_ingest_config.block_ms,
+        )
+        return response[0][1] if response else []
+
+    async def _drop_poison(self, entries: List[Entry]) -> List[Entry]:
+        # Re-delivered entries that keep failing are parked instead of blocking the stream
+        pending = await self.redis.xpending_range(
+            self.stream, self.group, min=entries[0][0], max=entries[-1][0],
+            count=len(entries), consumername=self.consumer,
+        )
+        deliveries = {item["message_id"]: item["times_delivered"] for item in pending}
+
+        retry, dead = [], []
+        for entry in entries:
+            if deliveries.get(entry[0], 0) > visit_ingest_config.max_deliveries:
+                dead.append(entry)
+            else:
+                retry.append(entry)
+
+        if dead:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                for _, fields in dead:
+                    pipe.xadd(
+                        self.stream + DEAD_LETTER_SUFFIX, fields,
+                        maxlen=visit_ingest_config.max_length, approximate=True,
+                    )
+                pipe.xack(self.stream, self.group, *[entry_id for entry_id, _ in dead])
+                pipe.xdel(self.stream, *[entry_id for entry_id, _ in dead])
+                await pipe.execute()
+            logger.error(f"Moved {len(dead)} visit events to {self.stream}{DEAD_LETTER_SUFFIX}")
+        return retry
+
+    async def process(self, entries: List[Entry]):
+        rows = await visit_service.enrich([fields for _, fields in entries], self.redis)
+        async with async_session() as db:
+            await visit_service.write_batch(db, rows)
+
+        # Ack only after the INSERT committed; a crash before this means re-delivery.
+        # The click counters move in the same transaction, so they count what was acked.
+        entry_ids = [entry_id for entry_id, _ in entries]
+        async with self.redis.pipeline(transaction=True) as pipe:
+            click_stats.record(pipe, rows)
+            pipe.xack(self.stream, self.group, *entry_ids)
+            pipe.xdel(self.stream, *entry_ids)
+            await pipe.execute()
+
+        now = time.monotonic()
+        if now - self.stats_logged_at >= STATS_LOG_INTERVAL:
+            self.stats_logged_at = now
+            logger.info(f"User-agent cache: {user_agent_service.stats()}")
+
+    async def run(self):
+        await self.ensure_group()
+        logger.info(f"Visit ingest consumer {self.consumer} reading {self.stream}")
+        while not self.stopping.is_set():
+            try:
+                entries = await self.read_batch()
+                if entries:
+                    await self.process(entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Unacked entries stay pending and are re-claimed after claim_idle_ms
+                logger.error(f"Visit ingest batch failed: {e}")
+                await asyncio.sleep(1)
+
+
+async def main():
+    redis = await get_redis()
+    worker = VisitIngestWorker(redis, consumer=f"{socket.gethostname()}-{os.getpid()}")
+
+    if visit_ingest_config.metrics_port:
+        start_http_server(visit_ingest_config.metrics_port)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stopping.set)
+    # Swap in an updated GeoIP database without restarting
+    loop.add_signal_handler(signal.SIGHUP, geo_service.reload)
+
+    try:
+        await worker.run()
+    finally:
+        await close_redis()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())